@@ -1,316 +1,605 @@
-from kivy.core.window import Window
-Window.title = "Meeting Assistant"  # Set the window title
-
-from kivy.app import App
-from kivy.uix.floatlayout import FloatLayout
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.button import Button
-from kivy.uix.label import Label
-from kivy.uix.textinput import TextInput
-from kivy.uix.image import Image
-from kivy.uix.popup import Popup
-from kivy.uix.filechooser import FileChooserListView
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.spinner import Spinner
-from kivy.clock import Clock
-
-import os
-import requests
-import threading
-import sounddevice as sd
-import numpy as np
-import wave
-
-API_URL = "http://127.0.0.1:5000"       
-# backend_meeting_assistant.railway.internal       backendmeetingassistant-production.up.railway.app
-# API_URL = "railway link -p 3fe3c4f0-bd20-4658-955c-eeabb52c98ca"
-
-def show_alert(message):
-    """Simple popup alert with message."""
-    content = BoxLayout(orientation='vertical', padding=10)
-    label = Label(text=message)
-    btn = Button(text="OK", size_hint_y=0.3)
-    content.add_widget(label)
-    content.add_widget(btn)
-    popup = Popup(title="Notification", content=content, size_hint=(0.6, 0.4))
-    btn.bind(on_press=popup.dismiss)
-    popup.open()
-
-def show_success(message):
-    """Large, centered success message popup with OK button."""
-    content = BoxLayout(orientation='vertical', padding=20)
-    label = Label(text=message, font_size=32, halign='center')
-    btn = Button(text="OK", size_hint=(None, None), size=(150, 50))
-    content.add_widget(label)
-    content.add_widget(btn)
-    popup = Popup(title="Success", content=content, size_hint=(0.8, 0.6), auto_dismiss=False)
-    btn.bind(on_press=popup.dismiss)
-    popup.open()
-
-class VoiceInputInterface(FloatLayout):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        
-        # --- History List (for storing messages) ---
-        self.history_list = []
-        
-        # Add background image (mic integrated)
-        self.bg_image = Image(
-            source="background.png",
-            allow_stretch=True,
-            keep_ratio=False,
-            pos_hint={'x': 0, 'y': 0},
-            size_hint=(1, 1)
-        )
-        self.add_widget(self.bg_image, index=0)
-        
-        # History button
-        self.history_button = Button(
-            text="History",
-            size_hint=(None, None),
-            size=(200, 50),
-            pos_hint={'right': 1, 'top': 1}
-        )
-        self.history_button.bind(on_press=self.open_history_popup)
-        self.add_widget(self.history_button)
-        
-        # Timer label
-        self.timer_label = Label(
-            text='00:00',
-            font_size=50,
-            color=(1, 1, 1, 1),
-            size_hint=(None, None),
-            pos_hint={'center_x': 0.5, 'center_y': 0.35}
-        )
-        self.add_widget(self.timer_label)
-        
-        # Bottom panel: text input + horizontal button panel
-        self.bottom_panel = BoxLayout(orientation='vertical', size_hint=(1, 0.25),
-                                      pos_hint={'x': 0, 'y': 0})
-        self.text_input = TextInput(
-            hint_text='Enter text...',
-            multiline=True,
-            size_hint_y=None,
-            height=150
-        )
-        self.bottom_panel.add_widget(self.text_input)
-        
-        self.button_panel = BoxLayout(orientation='horizontal', size_hint_y=None, height=80,
-                                      spacing=10, padding=[10, 0, 10, 0])
-        self.upload_button = Button(text='File Upload', size_hint_x=None, width=200)
-        self.upload_button.bind(on_press=self.open_file_chooser)
-        self.button_panel.add_widget(self.upload_button)
-        
-        self.send_button = Button(text='Send', size_hint_x=None, width=200)
-        self.send_button.bind(on_press=self.send_text)
-        self.button_panel.add_widget(self.send_button)
-        
-        self.bottom_panel.add_widget(self.button_panel)
-        self.add_widget(self.bottom_panel)
-        
-        # Audio recording variables
-        self.timer = 0
-        self.recording = False
-        self.audio_data = []
-
-    def add_history(self, message):
-        self.history_list.append(message)
-    
-    def on_touch_down(self, touch):
-        """Detect if user taps on the mic region of the background image."""
-        # If the touch isn't inside this layout, ignore
-        if not self.collide_point(*touch.pos):
-            return super().on_touch_down(touch)
-        
-        # Convert screen coords to local coords
-        local_x = touch.x - self.x
-        local_y = touch.y - self.y
-        
-        # bounding box for the mic region in normalized coords
-        mic_xmin = 0.3
-        mic_xmax = 0.7
-        mic_ymin = 0.4
-        mic_ymax = 0.8
-        
-        w, h = self.width, self.height
-        mic_left   = w * mic_xmin
-        mic_right  = w * mic_xmax
-        mic_bottom = h * mic_ymin
-        mic_top    = h * mic_ymax
-        
-        if mic_left <= local_x <= mic_right and mic_bottom <= local_y <= mic_top:
-            # user tapped mic area => toggle recording
-            self.toggle_recording(None)
-        
-        return super().on_touch_down(touch)
-    
-    def open_history_popup(self, instance):
-        """Open a popup showing the entire history, with multiline support."""
-        content = BoxLayout(orientation='vertical', padding=10)
-        scroll = ScrollView(size_hint=(1, 1), do_scroll_x=False, do_scroll_y=True)
-        history_box = BoxLayout(orientation='vertical', size_hint_y=None, spacing=5)
-        history_box.bind(minimum_height=history_box.setter('height'))
-        for msg in self.history_list:
-            lbl = Label(
-                text=msg,
-                size_hint_y=None,
-                halign='left',
-                valign='top'
-            )
-            lbl.bind(
-                texture_size=lambda inst, size: setattr(inst, 'size', size),
-                width=lambda inst, value: setattr(inst, 'text_size', (value, None))
-            )
-            lbl.padding = (10, 10)
-            history_box.add_widget(lbl)
-        
-        scroll.add_widget(history_box)
-        content.add_widget(scroll)
-        
-        close_button = Button(text="Close", size_hint_y=None, height=50)
-        content.add_widget(close_button)
-        
-        popup = Popup(title="History", content=content, size_hint=(0.9, 0.9))
-        close_button.bind(on_press=popup.dismiss)
-        popup.open()
-        
-        # Scroll to newest entry
-        if history_box.children:
-            newest_label = history_box.children[0]  # top child
-            Clock.schedule_once(lambda dt: scroll.scroll_to(newest_label), 0)
-    
-    def toggle_recording(self, instance):
-        if not self.recording:
-            self.recording = True
-            self.timer = 0
-            self.audio_data = []
-            self.timer_event = Clock.schedule_interval(self.update_timer, 1)
-            threading.Thread(target=self.record_audio).start()
-        else:
-            self.recording = False
-            Clock.unschedule(self.timer_event)
-            threading.Thread(target=self.save_audio_and_upload).start()
-    
-    def update_timer(self, dt):
-        self.timer += 1
-        minutes = self.timer // 60
-        seconds = self.timer % 60
-        self.timer_label.text = f"{minutes:02}:{seconds:02}"
-    
-    def record_audio(self):
-        with sd.InputStream(samplerate=16000, channels=1, callback=self.audio_callback):
-            while self.recording:
-                sd.sleep(100)
-    
-    def audio_callback(self, indata, frames, time, status):
-        if status:
-            print(status)
-        self.audio_data.append(indata.copy())
-    
-    def save_audio_and_upload(self):
-        filename = "recorded_audio.wav"
-        np_audio = np.concatenate(self.audio_data, axis=0)
-        with wave.open(filename, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(16000)
-            wf.writeframes((np_audio * 32767).astype(np.int16).tobytes())
-        try:
-            with open(filename, 'rb') as f:
-                files = {'audio_file': f}
-                response = requests.post(f"{API_URL}/api/upload_audio", files=files)
-            if response.status_code == 200:
-                result = response.json()
-                print(result)
-                self.add_history("Audio processed: " + filename)
-                Clock.schedule_once(lambda dt: show_success("Process Completed and File Saved successfully"), 0)
-            else:
-                Clock.schedule_once(lambda dt: show_alert("Upload completed, but unexpected response"), 0)
-        except Exception as e:
-            print("Error decoding JSON response:", e)
-            Clock.schedule_once(lambda dt: show_alert(f"Upload failed: {e}"), 0)
-    
-    def send_text(self, instance):
-        text = self.text_input.text.strip()
-        if text:
-            try:
-                response = requests.post(f"{API_URL}/api/process_text", json={"text": text})
-                if response.status_code == 200:
-                    result = response.json()
-                    print(result)
-                    self.add_history("Text processed. Summary: " + result.get("summary", ""))
-                    Clock.schedule_once(lambda dt: show_success("Process Completed and File Saved successfully"), 0)
-                else:
-                    Clock.schedule_once(lambda dt: show_alert("Text processed, but unexpected response"), 0)
-            except requests.exceptions.ConnectionError:
-                print("Backend server is not ready. Please try again shortly.")
-                Clock.schedule_once(lambda dt: show_alert("Backend server is not ready. Please try again shortly."), 0)
-            self.text_input.text = ""
-    
-    def open_file_chooser(self, instance):
-        if os.name == 'nt':
-            drives = []
-            for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
-                drive = f"{letter}:\\"
-                if os.path.exists(drive):
-                    drives.append(drive)
-            default_path = drives[0] if drives else "C:\\"
-        else:
-            default_path = "/storage/emulated/0"
-        
-        content = BoxLayout(orientation='vertical')
-        top_bar = BoxLayout(orientation='horizontal', size_hint_y=0.15, padding=[5,5,5,5], spacing=5)
-        back_button = Button(text="Back", size_hint_x=None, width=100)
-        top_bar.add_widget(back_button)
-        filechooser = FileChooserListView(path=default_path, filters=["*.wav", "*.mp3"])
-        if os.name == 'nt':
-            drive_spinner = Spinner(
-                text=default_path,
-                values=tuple(drives),
-                size_hint_x=None,
-                width=150
-            )
-            drive_spinner.bind(text=lambda spinner, text: setattr(filechooser, 'path', text))
-            top_bar.add_widget(drive_spinner)
-        else:
-            top_bar.add_widget(Label(text="", size_hint_x=1))
-        content.add_widget(top_bar)
-        content.add_widget(filechooser)
-        bottom_bar = BoxLayout(orientation='horizontal', size_hint_y=0.15, padding=[5,5,5,5])
-        select_button = Button(text="Select", size_hint_x=None, width=100)
-        bottom_bar.add_widget(select_button)
-        bottom_bar.add_widget(Label(text="", size_hint_x=1))
-        content.add_widget(bottom_bar)
-        popup = Popup(title="Select an audio file", content=content, size_hint=(0.9, 0.9))
-        back_button.bind(on_press=lambda inst: popup.dismiss())
-        
-        def on_select(inst):
-            if filechooser.selection:
-                file_path = filechooser.selection[0]
-                threading.Thread(target=self.upload_file, args=(file_path,)).start()
-                self.add_history("File uploaded: " + os.path.basename(file_path))
-                popup.dismiss()
-        select_button.bind(on_press=on_select)
-        popup.open()
-    
-    def upload_file(self, file_path):
-        try:
-            with open(file_path, 'rb') as f:
-                files = {'audio_file': f}
-                response = requests.post(f"{API_URL}/api/upload_audio", files=files)
-            if response.status_code == 200:
-                result = response.json()
-                print(result)
-                Clock.schedule_once(lambda dt: show_success("Process Completed and File Saved successfully"), 0)
-            else:
-                Clock.schedule_once(lambda dt: show_alert("File upload completed, but unexpected response"), 0)
-        except Exception as e:
-            print("Error uploading file:", e)
-            Clock.schedule_once(lambda dt: show_alert(f"Upload failed: {e}"), 0)
-
-class MeetingAssistantApp(App):
-    def build(self):
-        return VoiceInputInterface()
-
-if __name__ == '__main__':
+from kivy.core.window import Window
+Window.title = "Meeting Assistant"  # Set the window title
+
+from kivy.app import App
+from kivy.uix.floatlayout import FloatLayout
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+from kivy.uix.textinput import TextInput
+from kivy.uix.image import Image
+from kivy.uix.popup import Popup
+from kivy.uix.filechooser import FileChooserListView
+from kivy.uix.scrollview import ScrollView
+from kivy.uix.spinner import Spinner
+from kivy.clock import Clock
+
+import os
+import time
+import hashlib
+import functools
+import queue
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
+import sounddevice as sd
+import numpy as np
+import wave
+
+# Defaults to the local backend on the port app.py listens on.
+API_URL = os.environ.get("API_URL", f"http://127.0.0.1:{os.environ.get('PORT', 5000)}")
+JOB_POLL_INTERVAL = 2  # seconds between job status checks
+LIVE_TRANSCRIPTION = True  # stream audio to the backend while recording
+STREAM_CHUNK_SECONDS = 1  # audio sent per streaming request
+HISTORY_PAGE_SIZE = 20  # meetings fetched per history request
+UPLOAD_CHUNK_BYTES = 4 * 1024 * 1024  # bytes per resumable upload request
+UPLOAD_MAX_RETRIES = 5  # consecutive failed chunks before an upload gives up
+BUSY_RETRIES = 10  # retries of a request the server turned away as busy (429)
+RECORDING_SAMPLE_RATE = 16000
+RECORDING_BLOCK_SECONDS = 1  # samples per block handed to the WAV writer
+RECORDING_FILE = "recorded_audio.wav"  # local copy of the current recording
+# backend_meeting_assistant.railway.internal       backendmeetingassistant-production.up.railway.app
+# API_URL = "railway link -p 3fe3c4f0-bd20-4658-955c-eeabb52c98ca"
+
+# One pooled session, so repeated requests reuse their connection. A busy
+# server answers 429 before doing any work, so every method is retried after
+# the Retry-After delay it sends.
+http = requests.Session()
+http.mount(API_URL, HTTPAdapter(max_retries=Retry(
+    total=BUSY_RETRIES, connect=0, read=0, status_forcelist=[429], allowed_methods=None,
+    backoff_factor=1, respect_retry_after_header=True, raise_on_status=False,
+)))
+
+def wait_for_job(response):
+    """
+    Polls a queued upload job until it finishes and returns the final response.
+    """
+    result_url = API_URL + response.json()["result_url"]
+    while True:
+        response = http.get(result_url)
+        if response.status_code != 202:
+            return response
+        time.sleep(JOB_POLL_INTERVAL)
+
+def _file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for data in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+def upload_recording(file_path):
+    """
+    Uploads a file in checksummed chunks and returns the response of the
+    finalize request (the queued job). After a dropped connection or a
+    rejected chunk the upload resumes from the offset the server confirmed
+    instead of starting over.
+    """
+    size = os.path.getsize(file_path)
+    response = http.post(f"{API_URL}/api/uploads", json={"filename": os.path.basename(file_path), "size": size})
+    response.raise_for_status()
+    upload_url = API_URL + response.json()["upload_url"]
+    offset, failures = 0, 0
+    with open(file_path, 'rb') as f:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(UPLOAD_CHUNK_BYTES)
+            try:
+                response = http.put(upload_url, params={"offset": offset}, data=chunk,
+                                    headers={"X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest()})
+                if response.status_code in (200, 409):
+                    # 409 means the server has a different offset; continue from there.
+                    # At the same offset it means an earlier attempt at this chunk is
+                    # still being written, so back off as after an error.
+                    confirmed = response.json()["offset"]
+                    if response.status_code == 200 or confirmed != offset:
+                        offset = confirmed
+                        failures = 0
+                        continue
+            except requests.exceptions.RequestException as e:
+                print("Chunk upload failed:", e)
+            failures += 1
+            if failures > UPLOAD_MAX_RETRIES:
+                raise RuntimeError("Upload failed after repeated errors")
+            time.sleep(failures)
+            try:
+                offset = http.get(upload_url).json()["offset"]
+            except (requests.exceptions.RequestException, ValueError, KeyError):
+                pass
+    return http.post(f"{upload_url}/finalize", json={"sha256": _file_sha256(file_path)})
+
+class RecordingWriter:
+    """
+    Writes a mono 16-bit WAV file while recording. The audio callback scales
+    samples straight into preallocated int16 blocks, and a background thread
+    appends full blocks to the file, so memory stays at a few blocks however
+    long the meeting runs and closing only flushes the last partial block.
+    """
+
+    def __init__(self, filename, samplerate=RECORDING_SAMPLE_RATE, block_seconds=RECORDING_BLOCK_SECONDS):
+        self.filename = filename
+        self._block_size = int(samplerate * block_seconds)
+        self._scratch = np.empty(self._block_size, dtype=np.float32)
+        self._free = queue.Queue()
+        for _ in range(4):
+            self._free.put(np.empty(self._block_size, dtype=np.int16))
+        self._filled = queue.Queue()
+        self._block = self._free.get()
+        self._pos = 0
+        self._wav = wave.open(filename, 'wb')
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(samplerate)
+        self._thread = threading.Thread(target=self._write_blocks, daemon=True)
+        self._thread.start()
+
+    def write(self, samples):
+        """
+        Appends float samples in [-1, 1]. Called from the audio callback, so it
+        only allocates when the writer thread has fallen four blocks behind.
+        """
+        while len(samples):
+            n = min(len(samples), self._block_size - self._pos)
+            np.clip(samples[:n], -1.0, 1.0, out=self._scratch[:n])
+            np.multiply(self._scratch[:n], 32767, out=self._block[self._pos:self._pos + n], casting='unsafe')
+            self._pos += n
+            samples = samples[n:]
+            if self._pos == self._block_size:
+                self._filled.put((self._block, self._pos))
+                try:
+                    self._block = self._free.get_nowait()
+                except queue.Empty:
+                    self._block = np.empty(self._block_size, dtype=np.int16)
+                self._pos = 0
+
+    def _write_blocks(self):
+        while True:
+            item = self._filled.get()
+            if item is None:
+                break
+            block, length = item
+            self._wav.writeframesraw(block[:length].tobytes())
+            self._free.put(block)
+
+    def close(self):
+        """
+        Flushes the remaining samples and finalizes the WAV header. The audio
+        stream must be stopped first.
+        """
+        if self._pos:
+            self._filled.put((self._block, self._pos))
+        self._filled.put(None)
+        self._thread.join()
+        self._wav.close()
+
+def show_alert(message):
+    """Simple popup alert with message."""
+    content = BoxLayout(orientation='vertical', padding=10)
+    label = Label(text=message)
+    btn = Button(text="OK", size_hint_y=0.3)
+    content.add_widget(label)
+    content.add_widget(btn)
+    popup = Popup(title="Notification", content=content, size_hint=(0.6, 0.4))
+    btn.bind(on_press=popup.dismiss)
+    popup.open()
+
+def show_success(message):
+    """Large, centered success message popup with OK button."""
+    content = BoxLayout(orientation='vertical', padding=20)
+    label = Label(text=message, font_size=32, halign='center')
+    btn = Button(text="OK", size_hint=(None, None), size=(150, 50))
+    content.add_widget(label)
+    content.add_widget(btn)
+    popup = Popup(title="Success", content=content, size_hint=(0.8, 0.6), auto_dismiss=False)
+    btn.bind(on_press=popup.dismiss)
+    popup.open()
+
+def make_history_label(text):
+    """Multiline label that grows with its text, for the history list."""
+    lbl = Label(
+        text=text,
+        size_hint_y=None,
+        halign='left',
+        valign='top'
+    )
+    lbl.bind(
+        texture_size=lambda inst, size: setattr(inst, 'size', size),
+        width=lambda inst, value: setattr(inst, 'text_size', (value, None))
+    )
+    lbl.padding = (10, 10)
+    return lbl
+
+class VoiceInputInterface(FloatLayout):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        
+        # --- History List (for storing messages) ---
+        self.history_list = []
+        
+        # Add background image (mic integrated)
+        self.bg_image = Image(
+            source="background.png",
+            allow_stretch=True,
+            keep_ratio=False,
+            pos_hint={'x': 0, 'y': 0},
+            size_hint=(1, 1)
+        )
+        self.add_widget(self.bg_image, index=0)
+        
+        # History button
+        self.history_button = Button(
+            text="History",
+            size_hint=(None, None),
+            size=(200, 50),
+            pos_hint={'right': 1, 'top': 1}
+        )
+        self.history_button.bind(on_press=self.open_history_popup)
+        self.add_widget(self.history_button)
+        
+        # Timer label
+        self.timer_label = Label(
+            text='00:00',
+            font_size=50,
+            color=(1, 1, 1, 1),
+            size_hint=(None, None),
+            pos_hint={'center_x': 0.5, 'center_y': 0.35}
+        )
+        self.add_widget(self.timer_label)
+        
+        # Live transcript (streaming mode)
+        self.live_label = Label(
+            text='',
+            font_size=18,
+            color=(1, 1, 1, 1),
+            halign='center',
+            valign='top',
+            size_hint=(0.9, 0.1),
+            pos_hint={'center_x': 0.5, 'center_y': 0.28}
+        )
+        self.live_label.bind(size=lambda inst, value: setattr(inst, 'text_size', value))
+        self.add_widget(self.live_label)
+        
+        # Bottom panel: text input + horizontal button panel
+        self.bottom_panel = BoxLayout(orientation='vertical', size_hint=(1, 0.25),
+                                      pos_hint={'x': 0, 'y': 0})
+        self.text_input = TextInput(
+            hint_text='Enter text...',
+            multiline=True,
+            size_hint_y=None,
+            height=150
+        )
+        self.bottom_panel.add_widget(self.text_input)
+        
+        self.button_panel = BoxLayout(orientation='horizontal', size_hint_y=None, height=80,
+                                      spacing=10, padding=[10, 0, 10, 0])
+        self.upload_button = Button(text='File Upload', size_hint_x=None, width=200)
+        self.upload_button.bind(on_press=self.open_file_chooser)
+        self.button_panel.add_widget(self.upload_button)
+        
+        self.send_button = Button(text='Send', size_hint_x=None, width=200)
+        self.send_button.bind(on_press=self.send_text)
+        self.button_panel.add_widget(self.send_button)
+        
+        self.bottom_panel.add_widget(self.button_panel)
+        self.add_widget(self.bottom_panel)
+        
+        # Audio recording variables
+        self.timer = 0
+        self.recording = False
+        self.stream_queue = None
+
+    def add_history(self, message):
+        self.history_list.append(message)
+    
+    def on_touch_down(self, touch):
+        """Detect if user taps on the mic region of the background image."""
+        # If the touch isn't inside this layout, ignore
+        if not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+        
+        # Convert screen coords to local coords
+        local_x = touch.x - self.x
+        local_y = touch.y - self.y
+        
+        # bounding box for the mic region in normalized coords
+        mic_xmin = 0.3
+        mic_xmax = 0.7
+        mic_ymin = 0.4
+        mic_ymax = 0.8
+        
+        w, h = self.width, self.height
+        mic_left   = w * mic_xmin
+        mic_right  = w * mic_xmax
+        mic_bottom = h * mic_ymin
+        mic_top    = h * mic_ymax
+        
+        if mic_left <= local_x <= mic_right and mic_bottom <= local_y <= mic_top:
+            # user tapped mic area => toggle recording
+            self.toggle_recording(None)
+        
+        return super().on_touch_down(touch)
+    
+    def open_history_popup(self, instance):
+        """Open a popup listing stored meetings, loading further pages as the user scrolls."""
+        content = BoxLayout(orientation='vertical', padding=10)
+        search_input = TextInput(hint_text='Search meetings...', multiline=False, size_hint_y=None, height=40)
+        content.add_widget(search_input)
+        scroll = ScrollView(size_hint=(1, 1), do_scroll_x=False, do_scroll_y=True)
+        history_box = BoxLayout(orientation='vertical', size_hint_y=None, spacing=5)
+        history_box.bind(minimum_height=history_box.setter('height'))
+        scroll.add_widget(history_box)
+        content.add_widget(scroll)
+        
+        close_button = Button(text="Close", size_hint_y=None, height=50)
+        content.add_widget(close_button)
+        
+        popup = Popup(title="History", content=content, size_hint=(0.9, 0.9))
+        close_button.bind(on_press=popup.dismiss)
+        
+        # Newest meetings come first; next_before_id from the server points at the next page
+        state = {"query": None, "before_id": None, "more": True, "loading": False}
+        
+        def load_page():
+            if state["loading"] or not state["more"]:
+                return
+            state["loading"] = True
+            query = state["query"]
+            params = {"limit": HISTORY_PAGE_SIZE}
+            if state["before_id"] is not None:
+                params["before_id"] = state["before_id"]
+            if query:
+                params["q"] = query
+            
+            def fetch():
+                try:
+                    data = http.get(f"{API_URL}/api/meetings", params=params).json()
+                    Clock.schedule_once(lambda dt: show_page(query, data), 0)
+                except (requests.exceptions.RequestException, ValueError):
+                    Clock.schedule_once(lambda dt: show_local_history(query), 0)
+            threading.Thread(target=fetch, daemon=True).start()
+        
+        def show_page(query, data):
+            if query != state["query"]:
+                return  # results of an outdated search
+            state["loading"] = False
+            for meeting in data.get("meetings", []):
+                history_box.add_widget(make_history_label(
+                    f"{meeting['upload_time']}  {meeting['filename']}\nSummary: {meeting['summary']}"))
+            state["before_id"] = data.get("next_before_id")
+            state["more"] = state["before_id"] is not None
+            if not history_box.children:
+                history_box.add_widget(make_history_label("No meetings found."))
+            # Keep loading until the list is tall enough to scroll
+            Clock.schedule_once(lambda dt: history_box.height < scroll.height and load_page(), 0)
+        
+        def show_local_history(query):
+            # Backend unreachable: fall back to this session's messages
+            if query != state["query"]:
+                return
+            state["loading"] = False
+            state["more"] = False
+            for msg in reversed(self.history_list):
+                history_box.add_widget(make_history_label(msg))
+        
+        def on_scroll(inst, value):
+            if value <= 0.1:  # near the bottom
+                load_page()
+        
+        def on_search(inst):
+            state.update(query=inst.text.strip() or None, before_id=None, more=True, loading=False)
+            history_box.clear_widgets()
+            scroll.scroll_y = 1
+            load_page()
+        
+        scroll.bind(scroll_y=on_scroll)
+        search_input.bind(on_text_validate=on_search)
+        popup.open()
+        load_page()
+    
+    def toggle_recording(self, instance):
+        if not self.recording:
+            self.recording = True
+            self.timer = 0
+            self.timer_event = Clock.schedule_interval(self.update_timer, 1)
+            if LIVE_TRANSCRIPTION:
+                self.stream_queue = queue.Queue()
+                self.live_label.text = ''
+                threading.Thread(target=self.stream_audio).start()
+            threading.Thread(target=self.record_audio).start()
+        else:
+            self.recording = False
+            Clock.unschedule(self.timer_event)
+    
+    def update_timer(self, dt):
+        self.timer += 1
+        minutes = self.timer // 60
+        seconds = self.timer % 60
+        self.timer_label.text = f"{minutes:02}:{seconds:02}"
+    
+    def record_audio(self):
+        # Live recordings are written locally too, so a recording whose stream
+        # fails is uploaded by the stream thread instead of lost.
+        stream_queue = self.stream_queue
+        writer = RecordingWriter(RECORDING_FILE)
+        callback = functools.partial(self.audio_callback, writer, stream_queue)
+        with sd.InputStream(samplerate=RECORDING_SAMPLE_RATE, channels=1, callback=callback):
+            while self.recording:
+                sd.sleep(100)
+        writer.close()
+        if stream_queue is not None:
+            stream_queue.put(None)  # no more audio
+        else:
+            self.save_audio_and_upload(writer.filename)
+    
+    def audio_callback(self, writer, stream_queue, indata, frames, time, status):
+        if status:
+            print(status)
+        writer.write(indata[:, 0])
+        if stream_queue is not None:
+            stream_queue.put(indata.copy())
+    
+    def show_live_text(self, final_text, partial):
+        text = final_text
+        if partial:
+            text = (text + " " + partial["text"]).strip()
+        # Keep the tail that fits on screen
+        Clock.schedule_once(lambda dt: setattr(self.live_label, 'text', text[-300:]), 0)
+    
+    def stream_audio(self):
+        """Send audio to the backend while recording and show the live transcript."""
+        stream_queue = self.stream_queue
+        final_text = ""
+        done = False
+        try:
+            response = http.post(f"{API_URL}/api/stream")
+            session_url = f"{API_URL}/api/stream/{response.json()['session_id']}"
+            while not done:
+                chunks = []
+                deadline = time.time() + STREAM_CHUNK_SECONDS
+                while time.time() < deadline:
+                    try:
+                        block = stream_queue.get(timeout=max(deadline - time.time(), 0.01))
+                    except queue.Empty:
+                        continue
+                    if block is None:
+                        done = True
+                        break
+                    chunks.append(block)
+                if not chunks:
+                    continue
+                pcm = (np.clip(np.concatenate(chunks, axis=0), -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+                result = http.post(f"{session_url}/audio", data=pcm,
+                                       headers={'Content-Type': 'application/octet-stream'}).json()
+                for segment in result.get("segments", []):
+                    final_text = (final_text + " " + segment["text"]).strip()
+                self.show_live_text(final_text, result.get("partial"))
+            self._end_stream(stream_queue)
+            response = http.post(f"{session_url}/finish")
+            result = response.json()
+            self.show_live_text(result.get("transcription", final_text), None)
+            response = wait_for_job(response)
+            if response.status_code == 200:
+                print(response.json())
+                self.add_history("Live recording processed: " + result.get("transcription", ""))
+                Clock.schedule_once(lambda dt: show_success("Process Completed and File Saved successfully"), 0)
+            else:
+                print("Live recording job failed:", response.status_code)
+                self.save_audio_and_upload(RECORDING_FILE)
+        except Exception as e:
+            print("Error streaming audio:", e)
+            if not done:
+                Clock.schedule_once(lambda dt: show_alert(f"Live transcription failed: {e}"), 0)
+            # Keep taking audio until the recording stops, then upload the
+            # local copy in one piece.
+            while not done:
+                done = stream_queue.get() is None
+            self._end_stream(stream_queue)
+            self.save_audio_and_upload(RECORDING_FILE)
+    
+    def _end_stream(self, stream_queue):
+        # Called as soon as this stream stops taking audio. By the time its job
+        # finishes a newer recording may have its own queue, which stays.
+        if self.stream_queue is stream_queue:
+            self.stream_queue = None
+    
+    def save_audio_and_upload(self, filename):
+        try:
+            response = upload_recording(filename)
+            if response.status_code == 202:
+                response = wait_for_job(response)
+            if response.status_code == 200:
+                result = response.json()
+                print(result)
+                self.add_history("Audio processed: " + filename)
+                Clock.schedule_once(lambda dt: show_success("Process Completed and File Saved successfully"), 0)
+            else:
+                Clock.schedule_once(lambda dt: show_alert("Upload completed, but unexpected response"), 0)
+        except Exception as e:
+            print("Error decoding JSON response:", e)
+            Clock.schedule_once(lambda dt: show_alert(f"Upload failed: {e}"), 0)
+    
+    def send_text(self, instance):
+        text = self.text_input.text.strip()
+        if text:
+            try:
+                response = http.post(f"{API_URL}/api/process_text", json={"text": text})
+                if response.status_code == 200:
+                    result = response.json()
+                    print(result)
+                    self.add_history("Text processed. Summary: " + result.get("summary", ""))
+                    Clock.schedule_once(lambda dt: show_success("Process Completed and File Saved successfully"), 0)
+                else:
+                    Clock.schedule_once(lambda dt: show_alert("Text processed, but unexpected response"), 0)
+            except requests.exceptions.ConnectionError:
+                print("Backend server is not ready. Please try again shortly.")
+                Clock.schedule_once(lambda dt: show_alert("Backend server is not ready. Please try again shortly."), 0)
+            self.text_input.text = ""
+    
+    def open_file_chooser(self, instance):
+        if os.name == 'nt':
+            drives = []
+            for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+                drive = f"{letter}:\\"
+                if os.path.exists(drive):
+                    drives.append(drive)
+            default_path = drives[0] if drives else "C:\\"
+        else:
+            default_path = "/storage/emulated/0"
+        
+        content = BoxLayout(orientation='vertical')
+        top_bar = BoxLayout(orientation='horizontal', size_hint_y=0.15, padding=[5,5,5,5], spacing=5)
+        back_button = Button(text="Back", size_hint_x=None, width=100)
+        top_bar.add_widget(back_button)
+        filechooser = FileChooserListView(path=default_path, filters=["*.wav", "*.mp3"])
+        if os.name == 'nt':
+            drive_spinner = Spinner(
+                text=default_path,
+                values=tuple(drives),
+                size_hint_x=None,
+                width=150
+            )
+            drive_spinner.bind(text=lambda spinner, text: setattr(filechooser, 'path', text))
+            top_bar.add_widget(drive_spinner)
+        else:
+            top_bar.add_widget(Label(text="", size_hint_x=1))
+        content.add_widget(top_bar)
+        content.add_widget(filechooser)
+        bottom_bar = BoxLayout(orientation='horizontal', size_hint_y=0.15, padding=[5,5,5,5])
+        select_button = Button(text="Select", size_hint_x=None, width=100)
+        bottom_bar.add_widget(select_button)
+        bottom_bar.add_widget(Label(text="", size_hint_x=1))
+        content.add_widget(bottom_bar)
+        popup = Popup(title="Select an audio file", content=content, size_hint=(0.9, 0.9))
+        back_button.bind(on_press=lambda inst: popup.dismiss())
+        
+        def on_select(inst):
+            if filechooser.selection:
+                file_path = filechooser.selection[0]
+                threading.Thread(target=self.upload_file, args=(file_path,)).start()
+                self.add_history("File uploaded: " + os.path.basename(file_path))
+                popup.dismiss()
+        select_button.bind(on_press=on_select)
+        popup.open()
+    
+    def upload_file(self, file_path):
+        try:
+            response = upload_recording(file_path)
+            if response.status_code == 202:
+                response = wait_for_job(response)
+            if response.status_code == 200:
+                result = response.json()
+                print(result)
+                Clock.schedule_once(lambda dt: show_success("Process Completed and File Saved successfully"), 0)
+            else:
+                Clock.schedule_once(lambda dt: show_alert("File upload completed, but unexpected response"), 0)
+        except Exception as e:
+            print("Error uploading file:", e)
+            Clock.schedule_once(lambda dt: show_alert(f"Upload failed: {e}"), 0)
+
+class MeetingAssistantApp(App):
+    def build(self):
+        return VoiceInputInterface()
+
+if __name__ == '__main__':
     MeetingAssistantApp().run()
\ No newline at end of file
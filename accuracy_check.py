@@ -0,0 +1,158 @@
+import io
+import re
+import json
+import time
+import argparse
+
+import torch
+
+from inference import INFERENCE_MODES, load_whisper, load_summarizer
+from utilities import WHISPER_MODEL_NAME, SUMMARIZER_MODEL_NAME, process_audio, summarize_with
+
+
+def _words(text):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level edit distance between hypothesis and reference, divided by the
+    number of reference words.
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def _f1(overlap, reference_count, candidate_count):
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / candidate_count, overlap / reference_count
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge_n(reference, candidate, n):
+    def ngrams(words):
+        counts = {}
+        for i in range(len(words) - n + 1):
+            gram = tuple(words[i:i + n])
+            counts[gram] = counts.get(gram, 0) + 1
+        return counts
+    ref, cand = ngrams(_words(reference)), ngrams(_words(candidate))
+    overlap = sum(min(count, cand.get(gram, 0)) for gram, count in ref.items())
+    return _f1(overlap, sum(ref.values()), sum(cand.values()))
+
+
+def rouge_l(reference, candidate):
+    ref, cand = _words(reference), _words(candidate)
+    previous = [0] * (len(cand) + 1)
+    for ref_word in ref:
+        current = [0]
+        for j, cand_word in enumerate(cand, 1):
+            current.append(previous[j - 1] + 1 if ref_word == cand_word else max(previous[j], current[j - 1]))
+        previous = current
+    return _f1(previous[-1], len(ref), len(cand))
+
+
+def model_bytes(model):
+    """
+    Size of the model's serialized weights, including quantized packed ones.
+    """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def check_transcription(audio_files, mode):
+    baseline, candidate = load_whisper(WHISPER_MODEL_NAME, "fp32"), load_whisper(WHISPER_MODEL_NAME, mode)
+    results = []
+    for file_path in audio_files:
+        processed = process_audio(file_path)
+        reference, baseline_seconds = _timed(lambda: baseline.transcribe(processed, fp16=False)["text"])
+        hypothesis, candidate_seconds = _timed(lambda: candidate.transcribe(processed, fp16=False)["text"])
+        results.append({
+            "file": file_path,
+            "wer": round(word_error_rate(reference, hypothesis), 4),
+            "baseline_seconds": round(baseline_seconds, 3),
+            "candidate_seconds": round(candidate_seconds, 3),
+            "speedup": round(baseline_seconds / candidate_seconds, 2),
+            "baseline_text": reference,
+            "candidate_text": hypothesis,
+        })
+    return {
+        "baseline_model_bytes": model_bytes(baseline),
+        "candidate_model_bytes": model_bytes(candidate),
+        "files": results,
+    }
+
+
+def check_summarization(texts, mode):
+    baseline, candidate = load_summarizer(SUMMARIZER_MODEL_NAME, "fp32"), load_summarizer(SUMMARIZER_MODEL_NAME, mode)
+    results = []
+    for name, text in texts:
+        reference, baseline_seconds = _timed(summarize_with, baseline, text)
+        summary, candidate_seconds = _timed(summarize_with, candidate, text)
+        results.append({
+            "text": name,
+            "rouge1": round(rouge_n(reference, summary, 1), 4),
+            "rouge2": round(rouge_n(reference, summary, 2), 4),
+            "rougeL": round(rouge_l(reference, summary), 4),
+            "baseline_seconds": round(baseline_seconds, 3),
+            "candidate_seconds": round(candidate_seconds, 3),
+            "speedup": round(baseline_seconds / candidate_seconds, 2),
+        })
+    report = {"texts": results}
+    if mode != "onnx":
+        report["baseline_model_bytes"] = model_bytes(baseline.model)
+        report["candidate_model_bytes"] = model_bytes(candidate.model)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare a faster inference mode against the fp32 models (WER for Whisper, ROUGE for BART)."
+    )
+    parser.add_argument("--mode", choices=[m for m in INFERENCE_MODES if m != "fp32"], default="int8")
+    parser.add_argument("--audio", nargs="*", default=[], help="Recordings to transcribe with both models")
+    parser.add_argument("--text", nargs="*", default=[],
+                        help="Transcripts to summarize with both models (default: the fp32 transcripts)")
+    parser.add_argument("--output", default=None, help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    report = {"mode": args.mode}
+    if args.audio:
+        report["transcription"] = check_transcription(args.audio, args.mode)
+        for result in report["transcription"]["files"]:
+            print(f"{result['file']}: WER {result['wer']:.2%}, {result['speedup']}x faster")
+    texts = []
+    for path in args.text:
+        with open(path) as f:
+            texts.append((path, f.read()))
+    if not texts and args.audio:
+        texts = [(result["file"], result["baseline_text"]) for result in report["transcription"]["files"]]
+    if texts:
+        report["summarization"] = check_summarization(texts, args.mode)
+        for result in report["summarization"]["texts"]:
+            print(f"{result['text']}: ROUGE-1 {result['rouge1']:.3f}, ROUGE-2 {result['rouge2']:.3f}, "
+                  f"ROUGE-L {result['rougeL']:.3f}, {result['speedup']}x faster")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,69 +1,460 @@
-from flask import Flask, request, jsonify
-from werkzeug.utils import secure_filename
-from utilities import process_audio, transcribe_audio, summarize_text, save_to_database, text_to_speech
-import os
-
-app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = './app/audio_files'
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-@app.route('/api/upload_audio', methods=['POST'])
-def upload_audio_api():
-    try:
-        if 'audio_file' not in request.files:
-            return jsonify({"error": "No file uploaded"}), 400
-
-        file = request.files['audio_file']
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-
-        # Save the original audio file
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-
-        # Process the audio (noise reduction, resampling, etc.)
-        clean_audio_path = process_audio(file_path)
-        
-        # Transcribe the processed audio
-        transcription = transcribe_audio(clean_audio_path)
-        
-        # Summarize the transcription text
-        summary, key_points = summarize_text(transcription)
-        
-        # Generate a TTS audio summary from the text summary
-        audio_summary_file = text_to_speech(summary)
-        
-        # Save the transcription and summary data to the database
-        save_to_database(filename, transcription, summary, key_points)
-
-        return jsonify({
-            "filename": filename,
-            "transcription": transcription,
-            "summary": summary,
-            "key_points": key_points,
-            "audio_summary_file": audio_summary_file
-        }), 200
-
-    except Exception as e:
-        # Log your error (if needed) and return a 500 status code.
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/api/process_text', methods=['POST'])
-def process_text_api():
-    try:
-        data = request.json
-        text = data.get("text", "")
-        if not text:
-            return jsonify({"error": "Empty text"}), 400
-
-        summary, key_points = summarize_text(text)
-        return jsonify({"summary": summary, "key_points": key_points}), 200
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-if __name__ == '__main__':
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
-    # app.run(debug=True)
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from werkzeug.utils import secure_filename
+from utilities import summarize_text, warm_up_models
+from jobs import JobManager, preprocess_audio
+from uploads import ChunkedUploads, UploadError, UPLOAD_CHUNK_SIZE
+from result_cache import save_upload
+from streaming import StreamingSessions
+from batch_transcribe import transcribe_files
+from persistence import get_database, DatabaseBusyError
+from tts import get_synthesizer
+from model_registry import registry
+from metrics import PROFILE_DIR, PROFILING_ENABLED, profiled, stage_metrics
+from request_limiter import RequestLimiter, RETRY_AFTER_SECONDS
+import os
+import json
+import uuid
+import time
+import threading
+
+app = Flask(__name__)
+app.config['UPLOAD_FOLDER'] = './app/audio_files'
+app.config['BATCH_FOLDER'] = './app/batches'
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(app.config['BATCH_FOLDER'], exist_ok=True)
+
+job_manager = JobManager()
+stream_sessions = StreamingSessions(app.config['UPLOAD_FOLDER'])
+chunked_uploads = ChunkedUploads(app.config['UPLOAD_FOLDER'], preprocess=preprocess_audio)
+request_limiter = RequestLimiter()
+# Probes and metrics are answered even when the process is saturated.
+UNLIMITED_PATHS = ("/healthz", "/readyz", "/metrics")
+
+# Load the models at startup. With 0 each model is loaded by the first request
+# that needs it, so a text-only deployment never loads Whisper.
+WARM_UP_MODELS = os.environ.get("WARM_UP_MODELS", "1") != "0"
+
+# Startup progress reported by /readyz; ready is set once the job workers and
+# models are. The database is connected separately and does not block it.
+ready = threading.Event()
+startup_status = {"database": False, "database_error": None, "job_workers": False, "models": False, "error": None}
+
+# Delay before retrying an unreachable database, doubled per attempt up to the maximum.
+DB_RETRY_SECONDS = float(os.environ.get("DB_RETRY_SECONDS", "2"))
+DB_RETRY_MAX_SECONDS = float(os.environ.get("DB_RETRY_MAX_SECONDS", "60"))
+
+def start_background_services():
+    """
+    Starts the job workers and warms the models on a background thread, so the
+    server binds its port immediately, and connects the database on another.
+    Progress is reported by /readyz. An unreachable database is retried in the
+    background; until it is up, jobs run as usual and only their save stage
+    fails. Under gunicorn this runs in every worker; unfinished jobs of a
+    worker that died are taken over by the others (see JobManager).
+    """
+    def run():
+        try:
+            job_manager.start()
+            startup_status["job_workers"] = True
+            if WARM_UP_MODELS:
+                warm_up_models()
+            startup_status["models"] = True
+            ready.set()
+        except Exception as e:
+            startup_status["error"] = str(e)
+            print(f"Startup failed: {e}")
+
+    def connect_database():
+        delay = DB_RETRY_SECONDS
+        while True:
+            try:
+                get_database().start()
+                break
+            except Exception as e:
+                startup_status["database_error"] = str(e)
+                print(f"Database unavailable, retrying in {delay:.0f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, DB_RETRY_MAX_SECONDS)
+        startup_status["database"] = True
+        startup_status["database_error"] = None
+
+    threading.Thread(target=run, name="startup", daemon=True).start()
+    threading.Thread(target=connect_database, name="database-startup", daemon=True).start()
+
+@app.before_request
+def limit_concurrency():
+    if request.path in UNLIMITED_PATHS:
+        return None
+    if not request_limiter.acquire():
+        response = jsonify({"error": "Server is busy, retry later"})
+        response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+        return response, 429
+    g.holds_request_slot = True
+
+@app.teardown_request
+def release_concurrency_slot(exc):
+    # Streamed responses keep their slot until the stream ends.
+    if g.pop("holds_request_slot", False):
+        request_limiter.release()
+
+@app.route('/api/upload_audio', methods=['POST'])
+def upload_audio_api():
+    try:
+        if 'audio_file' not in request.files:
+            return jsonify({"error": "No file uploaded"}), 400
+
+        file = request.files['audio_file']
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+
+        # Save the original audio file under its content hash
+        filename = secure_filename(file.filename)
+        file_path, content_hash = save_upload(file.stream, app.config['UPLOAD_FOLDER'], filename)
+
+        # Queue noise reduction, transcription, summarization, TTS and the
+        # database write; the client polls /api/jobs/<id> for progress.
+        # Recordings that were processed before are answered from the cache.
+        job_id = job_manager.submit(filename, file_path, content_hash, profile=_profile_requested())
+        return _queued_job_response(job_id)
+
+    except Exception as e:
+        # Log your error (if needed) and return a 500 status code.
+        return jsonify({"error": str(e)}), 500
+
+def _queued_job_response(job_id):
+    return jsonify({
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}",
+        "result_url": f"/api/jobs/{job_id}/result"
+    }), 202
+
+def _upload_error_response(error):
+    body = {"error": str(error)}
+    if error.offset is not None:
+        body["offset"] = error.offset
+    return jsonify(body), error.status
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload_api():
+    """
+    Starts a resumable upload. The client then PUTs the file's bytes in order
+    to upload_url?offset=<n> (with an X-Chunk-SHA256 header per chunk), and
+    POSTs to upload_url/finalize once all bytes are sent. After a dropped
+    connection, GET upload_url returns the offset to continue from.
+    """
+    data = request.json or {}
+    filename = secure_filename(data.get("filename", ""))
+    if not filename:
+        return jsonify({"error": "No filename given"}), 400
+    size = data.get("size")
+    if size is not None and (not isinstance(size, int) or size < 0):
+        return jsonify({"error": "size must be a non-negative integer"}), 400
+    upload = chunked_uploads.create(filename, size)
+    return jsonify({
+        "upload_id": upload.id,
+        "upload_url": f"/api/uploads/{upload.id}",
+        "offset": upload.offset,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+    }), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status_api(upload_id):
+    upload = chunked_uploads.get(upload_id)
+    if upload is None:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify({"upload_id": upload.id, "filename": upload.filename, "size": upload.size,
+                    "offset": upload.offset}), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk_api(upload_id):
+    upload = chunked_uploads.get(upload_id)
+    if upload is None:
+        return jsonify({"error": "Unknown upload"}), 404
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        return jsonify({"error": "Missing offset"}), 400
+    try:
+        # The body is streamed straight into the upload's file.
+        new_offset = upload.write_chunk(offset, request.stream, request.headers.get("X-Chunk-SHA256"))
+    except UploadError as e:
+        return _upload_error_response(e)
+    return jsonify({"offset": new_offset}), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload_api(upload_id):
+    try:
+        if not chunked_uploads.abort(upload_id):
+            return jsonify({"error": "Unknown upload"}), 404
+    except UploadError as e:
+        return _upload_error_response(e)
+    return jsonify({"status": "aborted"}), 200
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload_api(upload_id):
+    data = request.json or {}
+    try:
+        upload = chunked_uploads.finalize(upload_id, data.get("sha256"))
+    except UploadError as e:
+        return _upload_error_response(e)
+    job_id = job_manager.submit(upload.filename, upload.final_path, upload.content_hash,
+                                profile=_profile_requested(), preprocessed=upload.preprocessed)
+    return _queued_job_response(job_id)
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status_api(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({
+        "job_id": job_id,
+        "filename": job["filename"],
+        "status": job["status"],
+        "stages": job["stages"],
+        "vad": job["result"].get("vad"),
+        "error": job["error"]
+    }), 200
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result_api(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": job["error"]}), 500
+    if job["status"] != "done":
+        return jsonify({"status": job["status"], "stages": job["stages"]}), 202
+    result = job["result"]
+    return jsonify({
+        "filename": job["filename"],
+        "transcription": result["transcription"],
+        "segments": result.get("segments", []),
+        "speakers": result.get("speakers", 0),
+        "summary": result["summary"],
+        "key_points": result["key_points"],
+        "audio_summary_file": result["audio_summary_file"]
+    }), 200
+
+@app.route('/api/batch_transcribe', methods=['POST'])
+def batch_transcribe_api():
+    """
+    Accepts many audio files (field 'audio_files') and transcribes them in the
+    background with batched Whisper decoding. Progress and per-file results are
+    available from /api/batch_transcribe/<batch_id>.
+    """
+    try:
+        files = [f for f in request.files.getlist('audio_files') if f.filename]
+        if not files:
+            return jsonify({"error": "No files uploaded"}), 400
+
+        batch_id = uuid.uuid4().hex
+        batch_dir = os.path.join(app.config['BATCH_FOLDER'], batch_id)
+        os.makedirs(batch_dir)
+        file_paths = []
+        for file in files:
+            file_path, _ = save_upload(file.stream, app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+            file_paths.append(file_path)
+
+        status = {os.path.basename(path): {"status": "queued"} for path in file_paths}
+        status_lock = threading.Lock()
+
+        def write_status(file_path=None, state=None, detail=None):
+            with status_lock:
+                if file_path is not None:
+                    key = "output" if state == "done" else "error"
+                    status[os.path.basename(file_path)] = {"status": state, key: detail}
+                with open(os.path.join(batch_dir, "status.json"), 'w') as f:
+                    json.dump(status, f)
+
+        def run():
+            try:
+                transcribe_files(file_paths, batch_dir, on_file_done=write_status)
+            except Exception as e:
+                for path in file_paths:
+                    if status[os.path.basename(path)]["status"] == "queued":
+                        write_status(path, "failed", str(e))
+
+        write_status()
+        threading.Thread(target=run, name=f"batch-{batch_id}", daemon=True).start()
+        return jsonify({"batch_id": batch_id, "status_url": f"/api/batch_transcribe/{batch_id}"}), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/batch_transcribe/<batch_id>', methods=['GET'])
+def batch_status_api(batch_id):
+    status_path = os.path.join(app.config['BATCH_FOLDER'], secure_filename(batch_id), "status.json")
+    if not os.path.exists(status_path):
+        return jsonify({"error": "Unknown batch"}), 404
+    with open(status_path) as f:
+        files = json.load(f)
+    for entry in files.values():
+        if entry["status"] == "done":
+            with open(entry["output"]) as result:
+                entry["result"] = json.load(result)
+    done = all(entry["status"] in ("done", "failed") for entry in files.values())
+    return jsonify({"batch_id": batch_id, "status": "done" if done else "running", "files": files}), 200
+
+@app.route('/api/stream', methods=['POST'])
+def stream_start_api():
+    session = stream_sessions.create()
+    return jsonify({"session_id": session.id}), 201
+
+@app.route('/api/stream/<session_id>/audio', methods=['POST'])
+def stream_audio_api(session_id):
+    """
+    Accepts a chunk of 16 kHz mono int16 PCM and returns the transcript segments
+    finalized by it along with the current partial segment.
+    """
+    session = stream_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown streaming session"}), 404
+    try:
+        finalized, partial = session.add_audio(request.get_data())
+        return jsonify({"segments": finalized, "partial": partial}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stream/<session_id>/finish', methods=['POST'])
+def stream_finish_api(session_id):
+    """
+    Finalizes the transcript and queues diarization, summarization, TTS and
+    the database write for the recording as a regular job.
+    """
+    session = stream_sessions.remove(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown streaming session"}), 404
+    try:
+        finalized = session.finish()
+        if finalized is None:
+            return jsonify({"error": "Streaming session is already finished"}), 404
+        filename = os.path.basename(session.output_path)
+        segments = [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in session.segments]
+        job_id = job_manager.submit_transcribed(filename, session.output_path, session.text, segments)
+        return jsonify({
+            "segments": finalized,
+            "transcription": session.text,
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}",
+            "result_url": f"/api/jobs/{job_id}/result"
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/tts', methods=['POST'])
+def tts_api():
+    """
+    Streams speech for the posted text sentence by sentence, so playback can
+    start as soon as the first sentence is synthesized.
+    """
+    data = request.json or {}
+    text = data.get("text", "")
+    if not text:
+        return jsonify({"error": "Empty text"}), 400
+    synthesizer = get_synthesizer()
+    return Response(stream_with_context(synthesizer.stream(text)), mimetype=synthesizer.mimetype)
+
+MAX_PAGE_SIZE = 100
+
+@app.route('/api/meetings', methods=['GET'])
+def meetings_api():
+    """
+    Lists stored meetings, newest first. Optional query parameters:
+    q (full-text search over transcription, summary and key points),
+    limit (page size) and before_id (the next_before_id of the previous page).
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), MAX_PAGE_SIZE)
+        before_id = request.args.get("before_id", type=int)
+        query = request.args.get("q", "").strip() or None
+        meetings, next_before_id = get_database().list_meetings(limit, before_id, query)
+        return jsonify({"meetings": meetings, "next_before_id": next_before_id}), 200
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    except DatabaseBusyError as e:
+        return _database_busy_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/meetings/search', methods=['GET'])
+def search_meetings_api():
+    if not request.args.get("q", "").strip():
+        return jsonify({"error": "Empty query"}), 400
+    return meetings_api()
+
+@app.route('/api/meetings/<int:meeting_id>', methods=['GET'])
+def meeting_api(meeting_id):
+    try:
+        meeting = get_database().get_meeting(meeting_id)
+        if meeting is None:
+            return jsonify({"error": "Unknown meeting"}), 404
+        return jsonify(meeting), 200
+    except DatabaseBusyError as e:
+        return _database_busy_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _database_busy_response(error):
+    response = jsonify({"error": str(error)})
+    response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response, 503
+
+@app.route('/api/process_text', methods=['POST'])
+def process_text_api():
+    try:
+        data = request.json
+        text = data.get("text", "")
+        if not text:
+            return jsonify({"error": "Empty text"}), 400
+
+        profile_path = os.path.join(PROFILE_DIR, f"process_text_{uuid.uuid4().hex}.prof") \
+            if _profile_requested() else None
+        with profiled(profile_path):
+            summary, key_points = summarize_text(text)
+        return jsonify({"summary": summary, "key_points": key_points}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _profile_requested():
+    # ?profile=1 dumps a cProfile trace of the request's work to PROFILE_DIR.
+    return PROFILING_ENABLED and request.args.get("profile") == "1"
+
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    """
+    Per-stage latency, CPU, memory and real-time factor, and request queueing,
+    in the Prometheus text exposition format. Under gunicorn each worker
+    reports its own numbers.
+    """
+    return Response(stage_metrics.render() + request_limiter.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/healthz', methods=['GET'])
+def healthz_api():
+    """
+    Liveness: the process is up and serving requests.
+    """
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz_api():
+    """
+    Readiness: 200 once the job workers and models are up, 503 while they are
+    still starting or if that failed. Database connectivity is reported in
+    "startup" but does not affect readiness.
+    """
+    return jsonify({
+        "ready": ready.is_set(),
+        "startup": startup_status,
+        "models_loaded": registry.status(),
+    }), 200 if ready.is_set() else 503
+
+if __name__ == '__main__':
+    # Development server. In production run `gunicorn -c gunicorn.conf.py app:app`,
+    # whose workers share one copy of the models.
+    debug = os.environ.get("FLASK_DEBUG") == "1"
+    # With the reloader enabled only the child process serves requests.
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
+    port = int(os.environ.get("PORT", 5000))
+    app.run(host="0.0.0.0", port=port, debug=debug)
+    # app.run(debug=True)
@@ -0,0 +1,208 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import soundfile as sf
+
+import vad
+from model_registry import registry
+from utilities import process_audio, load_vad_info
+
+# Number of 30 s mel segments decoded together in one Whisper forward pass.
+BATCH_SIZE = int(os.environ.get("BATCH_TRANSCRIBE_SIZE", "8"))
+PREPROCESS_WORKERS = int(os.environ.get("BATCH_PREPROCESS_WORKERS", str(os.cpu_count() or 1)))
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a")
+
+
+def _prepare(file_path, n_mels):
+    """
+    Preprocesses one file and cuts it into 30 s log-mel segments. Runs in a
+    worker process.
+    """
+    import whisper
+    processed_audio = process_audio(file_path)
+    audio, _ = sf.read(processed_audio, dtype='float32')
+    n_samples = whisper.audio.N_SAMPLES
+    mels = []
+    for start in range(0, len(audio), n_samples):
+        segment = whisper.pad_or_trim(audio[start:start + n_samples])
+        mels.append(whisper.log_mel_spectrogram(segment, n_mels=n_mels).numpy())
+    vad_info = load_vad_info(processed_audio)
+    return {
+        "file_path": file_path,
+        "processed_audio": processed_audio,
+        "duration": len(audio) / whisper.audio.SAMPLE_RATE,
+        "timeline": vad_info.pop("timeline"),
+        "vad": vad_info,
+        "mels": mels,
+    }
+
+
+def _split_at_timestamps(tokens, tokenizer, time_precision, window_seconds):
+    """
+    Splits the tokens decoded for one mel segment into (start, end, text)
+    segments at its timestamp tokens, with times relative to the segment.
+    Text after the last timestamp runs to the end of the window.
+    """
+    segments = []
+    start = 0.0
+    text_tokens = []
+    for token in tokens:
+        if token < tokenizer.timestamp_begin:
+            text_tokens.append(token)
+            continue
+        time = (token - tokenizer.timestamp_begin) * time_precision
+        if text_tokens:
+            segments.append((start, time, tokenizer.decode(text_tokens).strip()))
+            text_tokens = []
+        start = time
+    if text_tokens:
+        segments.append((start, window_seconds, tokenizer.decode(text_tokens).strip()))
+    return [segment for segment in segments if segment[2]]
+
+
+def _decode(mels):
+    """
+    Decodes a list of mel segments (possibly from different files) in a single
+    batched Whisper forward pass. Returns the (start, end, text) segments of
+    each mel segment, timed from its timestamp tokens.
+    """
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+    with registry.use("whisper") as model:
+        batch = torch.from_numpy(np.stack(mels)).to(model.device)
+        options = whisper.DecodingOptions(fp16=model.device.type == "cuda")
+        results = whisper.decode(model, batch, options)
+        tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+        # Seconds per timestamp token (0.02 s), as whisper.transcribe computes it.
+        input_stride = whisper.audio.N_FRAMES // model.dims.n_audio_ctx
+        time_precision = input_stride * whisper.audio.HOP_LENGTH / whisper.audio.SAMPLE_RATE
+    window_seconds = float(whisper.audio.CHUNK_LENGTH)
+    return [_split_at_timestamps(result.tokens, tokenizer, time_precision, window_seconds) for result in results]
+
+
+def _write_result(prepared, windows, output_dir):
+    window_seconds = 30.0
+    segments = []
+    for index, window in enumerate(windows):
+        offset = index * window_seconds
+        for start, end, text in window:
+            segments.append({
+                "start": round(vad.map_to_original(min(offset + start, prepared["duration"]), prepared["timeline"]), 2),
+                "end": round(vad.map_to_original(min(offset + end, prepared["duration"]), prepared["timeline"]), 2),
+                "text": text,
+            })
+    result = {
+        "file": os.path.basename(prepared["file_path"]),
+        "processed_audio": prepared["processed_audio"],
+        "transcription": " ".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "vad": prepared["vad"],
+    }
+    output_path = os.path.join(output_dir, os.path.splitext(result["file"])[0] + ".json")
+    with open(output_path, 'w') as f:
+        json.dump(result, f, indent=2)
+    return output_path
+
+
+def transcribe_files(file_paths, output_dir, batch_size=BATCH_SIZE, workers=PREPROCESS_WORKERS, on_file_done=None):
+    """
+    Transcribes many files at once. Files are preprocessed in parallel worker
+    processes, and their 30 s mel segments are packed into batches of
+    batch_size that are decoded in one forward pass each, regardless of which
+    file they came from. One JSON result is written per file to output_dir.
+
+    on_file_done(file_path, status, detail) is called as each file finishes,
+    with detail being the output path or the error message.
+    Returns a {file_path: {"status": ..., "output"/"error": ...}} mapping.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    on_file_done = on_file_done or (lambda file_path, status, detail: None)
+    with registry.use("whisper") as model:
+        n_mels = model.dims.n_mels
+    statuses = {}
+    prepared_files = {}
+    decoded = {}
+    pending = []
+
+    def finish(file_path, status, detail):
+        statuses[file_path] = {"status": status, "output" if status == "done" else "error": detail}
+        on_file_done(file_path, status, detail)
+
+    def flush(limit):
+        while len(pending) >= limit and pending:
+            batch, pending[:] = pending[:batch_size], pending[batch_size:]
+            try:
+                windows = _decode([mel for _, _, mel in batch])
+            except Exception as e:
+                for file_path in {file_path for file_path, _, _ in batch}:
+                    if file_path in prepared_files:
+                        del prepared_files[file_path]
+                        finish(file_path, "failed", f"Error transcribing audio: {e}")
+                continue
+            for (file_path, index, _), window in zip(batch, windows):
+                if file_path not in prepared_files:
+                    continue
+                decoded[file_path][index] = window
+                prepared = prepared_files[file_path]
+                if all(w is not None for w in decoded[file_path]):
+                    del prepared_files[file_path]
+                    finish(file_path, "done", _write_result(prepared, decoded.pop(file_path), output_dir))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_prepare, file_path, n_mels): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                prepared = future.result()
+            except Exception as e:
+                finish(file_path, "failed", str(e))
+                continue
+            mels = prepared.pop("mels")
+            if not mels:
+                # No speech at all.
+                finish(file_path, "done", _write_result(prepared, [], output_dir))
+                continue
+            prepared_files[file_path] = prepared
+            decoded[file_path] = [None] * len(mels)
+            pending.extend((file_path, index, mel) for index, mel in enumerate(mels))
+            flush(batch_size)
+    flush(1)
+    return statuses
+
+
+def _collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(AUDIO_EXTENSIONS) and not name.endswith("_processed.wav"):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe many recordings with batched Whisper decoding.")
+    parser.add_argument("paths", nargs="+", help="Audio files or folders of audio files")
+    parser.add_argument("--output-dir", default="./transcripts", help="Where to write one JSON result per file")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Mel segments per forward pass")
+    parser.add_argument("--workers", type=int, default=PREPROCESS_WORKERS, help="Preprocessing processes")
+    args = parser.parse_args()
+
+    files = _collect_files(args.paths)
+    print(f"Transcribing {len(files)} files")
+    statuses = transcribe_files(
+        files, args.output_dir, batch_size=args.batch_size, workers=args.workers,
+        on_file_done=lambda file_path, status, detail: print(f"{status}: {file_path} -> {detail}"),
+    )
+    failed = [f for f, s in statuses.items() if s["status"] != "done"]
+    print(f"Finished: {len(files) - len(failed)} done, {len(failed)} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import lfilter
+
+# Sentences the synthetic transcripts for summarization are drawn from.
+TRANSCRIPT_SENTENCES = [
+    "Let's start with a quick update on the release schedule.",
+    "The backend team finished the migration to the new database last week.",
+    "We still have two open bugs in the upload flow that block the beta.",
+    "Marketing wants a draft of the announcement by Friday.",
+    "Can someone take the action item to update the onboarding documentation?",
+    "Customer feedback on the new dashboard has been mostly positive.",
+    "The main complaint is that exports take too long for large accounts.",
+    "We agreed to move the design review to Thursday afternoon.",
+    "Budget for the next quarter needs to be approved before the end of the month.",
+    "Let's make sure every team lead sends their estimates by Wednesday.",
+]
+WORDS_PER_SECOND = 2.5
+
+
+def synthetic_speech(seconds, sr, snr_db=15.0, seed=0):
+    """
+    Generates speech-like audio: voiced syllables with a wandering pitch and
+    formant-shaped harmonics, grouped into words and phrases separated by
+    pauses, mixed with pink-ish background noise at snr_db.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sr)
+    speech = np.zeros(total, dtype=np.float64)
+    pos = int(rng.uniform(0.2, 1.0) * sr)
+    while pos < total:
+        # One phrase of a few words, then a pause.
+        for _ in range(rng.integers(3, 9)):
+            for _ in range(rng.integers(1, 4)):
+                length = int(rng.uniform(0.12, 0.3) * sr)
+                if pos + length >= total:
+                    break
+                t = np.arange(length) / sr
+                f0 = rng.uniform(100, 220) * (1 + rng.uniform(-0.15, 0.15) * t / t[-1])
+                phase = 2 * np.pi * np.cumsum(f0) / sr
+                formants = (rng.uniform(300, 800), rng.uniform(900, 2200), 2500.0)
+                syllable = np.zeros(length)
+                for k in range(1, 30):
+                    freq = k * f0.mean()
+                    if freq > sr / 2:
+                        break
+                    gain = sum(np.exp(-((freq - f) / 120.0) ** 2) for f in formants) + 0.02
+                    syllable += gain / k * np.sin(k * phase)
+                speech[pos:pos + length] += syllable * np.hanning(length)
+                pos += length + int(rng.uniform(0.0, 0.05) * sr)
+            pos += int(rng.uniform(0.05, 0.2) * sr)
+        pos += int(rng.uniform(0.3, 1.5) * sr)
+    speech /= np.abs(speech).max() or 1.0
+    speech *= 0.5
+    # Pink-ish noise: white noise through a one-pole low-pass.
+    noise = lfilter([1.0], [1.0, -0.97], rng.standard_normal(total))
+    speech_rms = np.sqrt(np.mean(speech[speech != 0] ** 2)) if speech.any() else 0.1
+    noise *= speech_rms / (np.sqrt(np.mean(noise ** 2)) * 10 ** (snr_db / 20))
+    return np.clip(speech + noise, -1, 1).astype(np.float32)
+
+
+def synthetic_transcript(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    words, sentences = 0, []
+    while words < seconds * WORDS_PER_SECOND:
+        sentence = TRANSCRIPT_SENTENCES[rng.integers(len(TRANSCRIPT_SENTENCES))]
+        sentences.append(sentence)
+        words += len(sentence.split())
+    return " ".join(sentences)
+
+
+def _stats(timings):
+    return {
+        "runs": len(timings),
+        "mean": round(float(np.mean(timings)), 4),
+        "min": round(float(np.min(timings)), 4),
+        "p50": round(float(np.percentile(timings, 50)), 4),
+        "p95": round(float(np.percentile(timings, 95)), 4),
+        "max": round(float(np.max(timings)), 4),
+    }
+
+
+def time_call(func, args, repeat, audio_seconds=None, trace=True):
+    """
+    Calls func(*args) repeat times and returns latency statistics, the real-time
+    factor (audio seconds per second) if audio_seconds is given, and the largest
+    rise in resident memory during a call (sampled as in metrics.StageTimer, so
+    it is not the process-lifetime peak left behind by an earlier benchmark).
+
+    With trace, one further call runs under tracemalloc for the peak of the
+    allocations it sees. Tracing slows down every allocation, so it is kept out
+    of the timed calls. It does not see memory allocated by torch, so callers
+    pass trace=False for the Whisper and BART stages, where it would mostly
+    miss the tensors.
+    """
+    from metrics import StageTimer
+    timings, rss_growth = [], 0
+    for _ in range(repeat):
+        timer = StageTimer()
+        with timer.time():
+            func(*args)
+        timings.append(timer.wall)
+        rss_growth = max(rss_growth, timer.rss_growth)
+    result = {"seconds": _stats(timings), "rss_growth_bytes": rss_growth}
+    if trace:
+        tracemalloc.start()
+        try:
+            func(*args)
+            result["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    if audio_seconds:
+        result["realtime_factor"] = round(audio_seconds / float(np.mean(timings)), 2)
+    return result
+
+
+def bench_functions(workdir, durations, sample_rates, repeat):
+    import utilities
+    results = []
+    for seconds in durations:
+        for sr in sample_rates:
+            path = os.path.join(workdir, f"bench_{seconds}s_{sr}.wav")
+            sf.write(path, synthetic_speech(seconds, sr, seed=seconds), sr)
+            processed = utilities.process_audio(path)
+            print(f"Benchmarking {seconds}s at {sr} Hz")
+            results.append({
+                "duration_seconds": seconds,
+                "sample_rate": sr,
+                "process_audio": time_call(utilities.process_audio, (path,), repeat, seconds),
+                "transcribe_audio": time_call(utilities.transcribe_audio, (processed,), repeat, seconds,
+                                              trace=False),
+            })
+    for seconds in durations:
+        text = synthetic_transcript(seconds, seed=seconds)
+        print(f"Benchmarking summarization of {len(text.split())} words")
+        results.append({
+            "duration_seconds": seconds,
+            "words": len(text.split()),
+            "summarize_text": time_call(utilities.summarize_text, (text,), repeat, trace=False),
+        })
+    return results
+
+
+def _run_concurrently(func, requests, concurrency):
+    """
+    Runs func(index) requests times on concurrency threads and returns the
+    per-request latency statistics and the overall requests per second.
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def run(index):
+        started = time.perf_counter()
+        try:
+            func(index)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "latency_seconds": _stats(latencies) if latencies else None,
+        "requests_per_second": round(len(latencies) / wall, 3),
+    }
+
+
+def bench_endpoints(workdir, seconds, sr, requests, concurrency):
+    import app as app_module
+    app = app_module.app
+    text = synthetic_transcript(seconds)
+
+    def process_text(index):
+        response = app.test_client().post('/api/process_text', json={"text": text})
+        if response.status_code != 200:
+            raise RuntimeError(response.get_json().get("error"))
+
+    def upload_audio(index):
+        # Every request gets different noise so the result cache never answers.
+        path = os.path.join(workdir, f"upload_{index}.wav")
+        sf.write(path, synthetic_speech(seconds, sr, seed=1000 + index), sr)
+        client = app.test_client()
+        with open(path, 'rb') as f:
+            response = client.post('/api/upload_audio', data={"audio_file": (f, os.path.basename(path))},
+                                   content_type='multipart/form-data')
+        if response.status_code != 202:
+            raise RuntimeError(response.get_json().get("error"))
+        result_url = response.get_json()["result_url"]
+        while True:
+            response = client.get(result_url)
+            if response.status_code == 200:
+                return
+            if response.status_code != 202:
+                raise RuntimeError(response.get_json().get("error"))
+            time.sleep(0.1)
+
+    print(f"Benchmarking /api/process_text with {requests} requests")
+    results = {"process_text": _run_concurrently(process_text, requests, concurrency)}
+    print(f"Benchmarking /api/upload_audio with {requests} requests of {seconds}s")
+    results["upload_audio"] = _run_concurrently(upload_audio, requests, concurrency)
+    results["upload_audio"]["duration_seconds"] = seconds
+    results["upload_audio"]["sample_rate"] = sr
+    return results
+
+
+def environment_info():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import torch
+        info["torch_threads"] = torch.get_num_threads()
+        info["cuda"] = torch.cuda.is_available()
+    except ImportError:
+        pass
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+
+def _mean_seconds(results, prefix=""):
+    """
+    Flattens a results document into {metric path: mean seconds}.
+    """
+    flat = {}
+    if isinstance(results, dict):
+        if "mean" in results and "runs" in results:
+            return {prefix: results["mean"]}
+        for key, value in results.items():
+            flat.update(_mean_seconds(value, f"{prefix}/{key}" if prefix else key))
+    elif isinstance(results, list):
+        for entry in results:
+            label = "/".join(str(entry[key]) for key in ("duration_seconds", "sample_rate", "words") if key in entry)
+            flat.update(_mean_seconds(entry, f"{prefix}/{label}" if prefix else label))
+    return flat
+
+
+def compare(baseline_path, results):
+    with open(baseline_path) as f:
+        baseline = _mean_seconds(json.load(f))
+    current = _mean_seconds(results)
+    print(f"{'metric':<70} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric in sorted(current):
+        if metric in baseline and baseline[metric]:
+            change = current[metric] / baseline[metric] - 1
+            print(f"{metric:<70} {baseline[metric]:>10.3f} {current[metric]:>10.3f} {change:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audio-to-summary pipeline on synthetic recordings.")
+    parser.add_argument("--durations", type=int, nargs="+", default=[30, 120], help="Recording lengths in seconds")
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=[16000, 44100], help="Recording sample rates")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per function")
+    parser.add_argument("--requests", type=int, default=8, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent endpoint clients")
+    parser.add_argument("--skip-endpoints", action="store_true", help="Only time the utilities functions")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    parser.add_argument("--compare", default=None, help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    # Everything the app writes (uploads, job store, caches, the meetings
+    # database) goes to a scratch directory, with SQLite standing in for MySQL.
+    workdir = tempfile.mkdtemp(prefix="meeting_benchmark_")
+    os.environ["DB_BACKEND"] = "sqlite"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+
+    import utilities
+    from persistence import get_database
+    started = time.perf_counter()
+    utilities.warm_up_models()
+    results = {
+        "environment": environment_info(),
+        "config": vars(args),
+        "warm_up_seconds": round(time.perf_counter() - started, 2),
+        "functions": bench_functions(workdir, args.durations, args.sample_rates, args.repeat),
+    }
+    if not args.skip_endpoints:
+        import app as app_module
+        get_database().start()
+        app_module.job_manager.start()
+        results["endpoints"] = bench_endpoints(
+            workdir, args.durations[0], args.sample_rates[-1], args.requests, args.concurrency
+        )
+        app_module.job_manager.shutdown()
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    if compare_path:
+        compare(compare_path, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import os
+import numpy as np
+
+# Speaker diarization on mono float audio: speech is cut into short windows,
+# each window gets a spectral embedding (mean and spread of its MFCCs), and the
+# embeddings are clustered into speakers. The audio is read in blocks, so memory
+# does not grow with the recording length, and the window statistics are
+# computed for all windows at once, so diarization costs a small fraction of
+# transcription.
+DIARIZATION_ENABLED = os.environ.get("DIARIZATION_ENABLED", "1") == "1"
+# Fixed number of speakers, or 0 to estimate it (up to DIARIZATION_MAX_SPEAKERS).
+DIARIZATION_SPEAKERS = int(os.environ.get("DIARIZATION_SPEAKERS", "0"))
+DIARIZATION_MAX_SPEAKERS = int(os.environ.get("DIARIZATION_MAX_SPEAKERS", "6"))
+WINDOW_SECONDS = 1.5
+HOP_SECONDS = 0.75
+# Trailing windows shorter than this are dropped; a shorter region still gets one.
+MIN_WINDOW_SECONDS = 0.5
+FRAME_SECONDS = 0.025
+FRAME_HOP_SECONDS = 0.01
+N_MFCC = 20
+# An estimated split into several speakers is kept only if its silhouette score
+# (on at most SILHOUETTE_SAMPLE windows) reaches this; otherwise it is one speaker.
+MIN_SILHOUETTE = 0.25
+SILHOUETTE_SAMPLE = 1000
+KMEANS_ITERATIONS = 30
+KMEANS_RESTARTS = 4
+
+
+def _mfcc_blocks(blocks, sr):
+    """
+    Yields the MFCC frames of consecutive audio blocks. Each block is prefixed
+    with the samples the previous block's frames did not reach, so the frames
+    are the same as those of a single pass over the whole recording.
+    """
+    import librosa
+    n_fft, hop = int(FRAME_SECONDS * sr), int(FRAME_HOP_SECONDS * sr)
+    carry = np.zeros(0, dtype=np.float32)
+    for block in blocks:
+        buffer = np.concatenate([carry, block])
+        n_frames = (len(buffer) - n_fft) // hop + 1 if len(buffer) >= n_fft else 0
+        if n_frames:
+            mfcc = librosa.feature.mfcc(y=buffer[:(n_frames - 1) * hop + n_fft], sr=sr, n_mfcc=N_MFCC,
+                                        n_fft=n_fft, hop_length=hop, center=False)
+            # The first coefficient is loudness, which says more about the
+            # microphone distance than about the speaker.
+            yield mfcc[1:].T.astype(np.float64)
+        carry = buffer[n_frames * hop:]
+
+
+def windows(regions, window=WINDOW_SECONDS, hop=HOP_SECONDS, min_window=MIN_WINDOW_SECONDS):
+    """
+    Cuts (start, end) regions in seconds into overlapping windows and returns
+    their start and end times as two arrays.
+    """
+    starts, ends = [], []
+    for start, end in regions:
+        if end - start <= window:
+            starts.append(start)
+            ends.append(end)
+            continue
+        window_starts = np.arange(start, end - min_window, hop)
+        starts.extend(window_starts)
+        ends.extend(np.minimum(window_starts + window, end))
+    return np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64)
+
+
+def embeddings(blocks, sr, n_samples, starts, ends):
+    """
+    Returns one embedding per window of the audio in blocks (n_samples in
+    total): the mean and standard deviation of its MFCC frames, normalized
+    across windows and scaled to unit length. Window statistics are differences
+    of running sums, read off at each window's first and last frame as the
+    blocks go by, so their cost does not depend on the window length or overlap.
+    """
+    n_fft, hop = int(FRAME_SECONDS * sr), int(FRAME_HOP_SECONDS * sr)
+    n_frames = (n_samples - n_fft) // hop + 1
+    first = np.clip((starts * sr / hop).astype(int), 0, n_frames - 1)
+    last = np.clip((ends * sr / hop).astype(int), first + 1, n_frames)
+    boundaries = np.concatenate([first, last])
+    order = np.argsort(boundaries, kind="stable")
+    sorted_boundaries = boundaries[order]
+    total = np.zeros((len(boundaries), N_MFCC - 1))
+    total_sq = np.zeros((len(boundaries), N_MFCC - 1))
+    running, running_sq = np.zeros(N_MFCC - 1), np.zeros(N_MFCC - 1)
+    position, taken = 0, 0
+    for frames in _mfcc_blocks(blocks, sr):
+        prefix = running + np.vstack([np.zeros(frames.shape[1]), np.cumsum(frames, axis=0)])
+        prefix_sq = running_sq + np.vstack([np.zeros(frames.shape[1]), np.cumsum(frames ** 2, axis=0)])
+        end = np.searchsorted(sorted_boundaries, position + len(frames), side="right")
+        reached = order[taken:end]
+        total[reached] = prefix[boundaries[reached] - position]
+        total_sq[reached] = prefix_sq[boundaries[reached] - position]
+        running, running_sq = prefix[-1], prefix_sq[-1]
+        position, taken = position + len(frames), end
+    # Boundaries past the last frame (if the audio was shorter than n_samples).
+    total[order[taken:]] = running
+    total_sq[order[taken:]] = running_sq
+    n = len(starts)
+    count = (last - first)[:, None]
+    mean = (total[n:] - total[:n]) / count
+    std = np.sqrt(np.maximum((total_sq[n:] - total_sq[:n]) / count - mean ** 2, 0.0))
+    x = np.hstack([mean, std])
+    x = (x - x.mean(axis=0)) / (x.std(axis=0) + 1e-8)
+    return x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-8)
+
+
+def _squared_distances(x, centers):
+    return np.maximum((x ** 2).sum(axis=1)[:, None] - 2 * x @ centers.T + (centers ** 2).sum(axis=1), 0.0)
+
+
+def _kmeans_once(x, k, rng):
+    centers = [x[rng.integers(len(x))]]
+    closest = _squared_distances(x, centers[0][None])[:, 0]
+    for _ in range(1, k):
+        if closest.sum() <= 0:
+            break
+        centers.append(x[rng.choice(len(x), p=closest / closest.sum())])
+        closest = np.minimum(closest, _squared_distances(x, centers[-1][None])[:, 0])
+    centers = np.array(centers)
+    for _ in range(KMEANS_ITERATIONS):
+        distances = _squared_distances(x, centers)
+        labels = distances.argmin(axis=1)
+        members = labels[:, None] == np.arange(len(centers))
+        counts = members.sum(axis=0)
+        updated = np.where(counts[:, None] > 0, members.T @ x / np.maximum(counts, 1)[:, None], centers)
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+    return labels, distances[np.arange(len(x)), labels].sum()
+
+
+def kmeans(x, k, rng, restarts=KMEANS_RESTARTS):
+    """
+    Returns cluster labels for the rows of x: the tightest of several k-means
+    runs with k-means++ seeding.
+    """
+    return min((_kmeans_once(x, k, rng) for _ in range(restarts)), key=lambda run: run[1])[0]
+
+
+def silhouette(x, labels):
+    """
+    Mean silhouette score of a clustering: near 1 for well separated
+    clusters, near 0 for a split of what is really one cluster.
+    """
+    n = len(x)
+    distances = np.sqrt(_squared_distances(x, x))
+    members = labels[:, None] == np.arange(labels.max() + 1)
+    counts = members.sum(axis=0)
+    sums = distances @ members
+    own = counts[labels]
+    a = sums[np.arange(n), labels] / np.maximum(own - 1, 1)
+    means = np.where(counts > 0, sums / np.maximum(counts, 1), np.inf)
+    means[np.arange(n), labels] = np.inf
+    b = means.min(axis=1)
+    scores = np.where(own > 1, (b - a) / np.maximum(np.maximum(a, b), 1e-12), 0.0)
+    return float(scores.mean())
+
+
+def cluster_speakers(x, n_speakers=DIARIZATION_SPEAKERS, max_speakers=DIARIZATION_MAX_SPEAKERS, seed=0):
+    """
+    Clusters window embeddings into speakers and returns one label per window,
+    numbered from 0 in order of first appearance. With n_speakers=0 the
+    number of speakers is the k with the best silhouette score, or 1 if no
+    split reaches MIN_SILHOUETTE.
+    """
+    rng = np.random.default_rng(seed)
+    if len(x) < 2:
+        return np.zeros(len(x), dtype=int)
+    if n_speakers > 0:
+        labels = kmeans(x, min(n_speakers, len(x)), rng)
+    else:
+        sample = rng.choice(len(x), size=min(len(x), SILHOUETTE_SAMPLE), replace=False)
+        labels, best = np.zeros(len(x), dtype=int), MIN_SILHOUETTE
+        for k in range(2, min(max_speakers, len(x) - 1) + 1):
+            candidate = kmeans(x, k, rng)
+            if len(np.unique(candidate[sample])) < 2:
+                continue
+            score = silhouette(x[sample], candidate[sample])
+            if score > best:
+                labels, best = candidate, score
+    _, first_seen = np.unique(labels, return_index=True)
+    order = np.argsort(np.argsort(first_seen))
+    return order[labels]
+
+
+def assign_speakers(segments, window_centers, labels):
+    """
+    Returns copies of segments with a "speaker" label, and the number of
+    speakers among them. Each segment gets the most common speaker among the
+    windows centred inside it, or the nearest window's if it is too short to
+    contain one. Speakers are numbered from 1 in order of their first segment,
+    so a cluster that wins no segment leaves no gap. window_centers must be
+    sorted and in the same time base as the segments.
+    """
+    clusters = []
+    for segment in segments:
+        lo = np.searchsorted(window_centers, segment["start"], side="left")
+        hi = np.searchsorted(window_centers, segment["end"], side="right")
+        if hi > lo:
+            clusters.append(int(np.bincount(labels[lo:hi]).argmax()))
+        else:
+            middle = (segment["start"] + segment["end"]) / 2
+            clusters.append(int(labels[np.abs(window_centers - middle).argmin()]))
+    numbers = {}
+    for cluster in clusters:
+        numbers.setdefault(cluster, len(numbers) + 1)
+    attributed = [dict(segment, speaker=f"Speaker {numbers[cluster]}") for segment, cluster in zip(segments, clusters)]
+    return attributed, len(numbers)
+
+
+def diarize(blocks, sr, n_samples, segments, regions=None, to_original=None, n_speakers=DIARIZATION_SPEAKERS):
+    """
+    Attributes transcript segments to speakers.
+
+    blocks are consecutive mono blocks of the audio that was transcribed,
+    n_samples long in total, and regions are its speech regions in seconds
+    (the whole audio by default). Segment times are in the original recording,
+    and to_original maps a time in the audio to it. Returns the segments with a
+    "speaker" label and the number of speakers found.
+    """
+    if not segments or n_samples < int(FRAME_SECONDS * sr):
+        return segments, 0
+    starts, ends = windows(regions if regions is not None else [(0.0, n_samples / sr)])
+    if len(starts) == 0:
+        return segments, 0
+    labels = cluster_speakers(embeddings(blocks, sr, n_samples, starts, ends), n_speakers)
+    centers = (starts + ends) / 2
+    if to_original is not None:
+        centers = np.array([to_original(t) for t in centers])
+    order = np.argsort(centers, kind="stable")
+    return assign_speakers(segments, centers[order], labels[order])
@@ -0,0 +1,72 @@
+import gc
+import os
+import multiprocessing
+
+from request_limiter import MAX_ACTIVE_REQUESTS, MAX_QUEUED_REQUESTS
+
+# Production server: gunicorn -c gunicorn.conf.py app:app
+#
+# The app, and unless WARM_UP_MODELS=0 the Whisper and BART weights, are loaded
+# once in the master process before the workers are forked, so every worker
+# shares them copy-on-write instead of holding its own copy.
+
+cores = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", str(max(1, cores // 2))))
+worker_class = "gthread"
+# gthread accepts up to worker_connections connections and hands each request
+# to the thread pool, where it waits unseen by the request limiter until a
+# thread is free. So there are threads for the requests a worker admits and
+# queues (see request_limiter.py) plus REJECT_THREADS more, which only ever
+# answer 429 (or a health check) and are freed at once: every request a worker
+# accepts beyond what it admits reaches the limiter and gets a Retry-After,
+# rather than waiting inside gunicorn with the client none the wiser.
+REJECT_THREADS = int(os.environ.get("REJECT_THREADS", "8"))
+threads = MAX_ACTIVE_REQUESTS + MAX_QUEUED_REQUESTS + REJECT_THREADS
+# Connections beyond this wait in the listen backlog. The margin over threads
+# is for idle keep-alive connections, which hold no thread.
+worker_connections = threads * 4
+preload_app = True
+# gthread workers heartbeat independently of their request threads, so long
+# requests are not killed; this only catches a worker that is stuck.
+timeout = int(os.environ.get("WORKER_TIMEOUT", "120"))
+# On SIGTERM, workers stop accepting connections and get this long to finish
+# the requests in flight before they are killed.
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "60"))
+keepalive = 5
+accesslog = "-"
+
+# Split the cores between the workers' torch thread pools rather than letting
+# each worker start one thread per core. Read by inference.py, which the
+# preloaded app imports after this file has been evaluated.
+os.environ.setdefault("TORCH_THREADS", str(max(1, cores // workers)))
+
+
+def when_ready(server):
+    # Runs in the master once the port is bound and before any worker is
+    # forked; connections wait in the listen backlog until the workers are up.
+    from app import WARM_UP_MODELS
+    from model_registry import registry
+    if WARM_UP_MODELS:
+        registry.preload()
+    # Keep everything allocated so far out of the workers' garbage collections,
+    # which would otherwise write to (and so copy) the shared pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    # Jobs run in the worker that accepted them. Jobs left unfinished by a
+    # worker that exited, crashed or was killed are resumed by another worker
+    # once its heartbeat stops.
+    app.start_background_services()
+
+
+def worker_exit(server, worker):
+    # Write the meeting records still waiting in the write-behind buffer, and
+    # let the other workers take over this worker's unfinished jobs at once.
+    import app
+    from persistence import get_database
+    get_database().flush()
+    app.job_manager.release_jobs()
@@ -0,0 +1,92 @@
+import os
+
+# How Whisper and BART run on the CPU:
+#   "fp32" - the models as published
+#   "int8" - dynamic int8 quantization of every Linear layer
+#   "onnx" - BART exported to ONNX Runtime; Whisper as in "int8"
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "fp32")
+INFERENCE_MODES = ("fp32", "int8", "onnx")
+# Intra-op threads per process. 0 keeps torch's default (one per core), which
+# oversubscribes the CPU when several workers share a machine.
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", "0"))
+ONNX_EXPORT_DIR = os.environ.get("ONNX_EXPORT_DIR", "./app/onnx")
+
+
+def configure_threads(threads=TORCH_THREADS):
+    import torch
+    if threads <= 0:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(max(1, threads // 2))
+    except RuntimeError:
+        # Only allowed before the first inter-op parallel work in the process.
+        pass
+
+
+def quantize_linear_layers(model):
+    """
+    Replaces every Linear layer of model with a dynamically quantized int8
+    version, in place. Weights are stored as int8 and activations are quantized
+    on the fly, which cuts their memory by 4x and speeds up CPU matmuls.
+    """
+    import torch
+    for module in model.modules():
+        # Whisper subclasses Linear only to cast weights for fp16; the quantizer
+        # matches exact types, so such subclasses are turned back into Linear.
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _check_mode(mode):
+    import torch
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode '{mode}'")
+    if mode != "fp32" and torch.cuda.is_available():
+        print(f"Warning: inference mode '{mode}' runs on the CPU even though CUDA is available.")
+
+
+def load_whisper(name, mode=INFERENCE_MODE):
+    import torch
+    import whisper
+    _check_mode(mode)
+    configure_threads()
+    if not torch.cuda.is_available():
+        print("Warning: CUDA is not available. Running Whisper on CPU.")
+    if mode == "fp32":
+        return whisper.load_model(name)
+    model = whisper.load_model(name, device="cpu")
+    model.eval()
+    return quantize_linear_layers(model)
+
+
+def load_summarizer(name, mode=INFERENCE_MODE):
+    from transformers import pipeline
+    _check_mode(mode)
+    configure_threads()
+    if mode == "onnx":
+        return pipeline("summarization", model=_load_onnx_seq2seq(name), tokenizer=name)
+    if mode == "fp32":
+        return pipeline("summarization", model=name)
+    summarizer = pipeline("summarization", model=name, device=-1)
+    summarizer.model.eval()
+    quantize_linear_layers(summarizer.model)
+    return summarizer
+
+
+def _load_onnx_seq2seq(name):
+    """
+    Returns name as an ONNX Runtime seq2seq model, exporting it on first use
+    and reusing the export from ONNX_EXPORT_DIR afterwards.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise RuntimeError("Inference mode 'onnx' needs the optimum[onnxruntime] package")
+    export_dir = os.path.join(ONNX_EXPORT_DIR, name.replace("/", "--"))
+    if os.path.isdir(export_dir):
+        return ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+    model = ORTModelForSeq2SeqLM.from_pretrained(name, export=True)
+    model.save_pretrained(export_dir)
+    return model
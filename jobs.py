@@ -0,0 +1,435 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from metrics import PROFILE_DIR, profiled, stage_metrics
+from pipeline_engine import Stage, StagedPipeline
+from result_cache import ResultCache, hash_pcm
+from utilities import (process_audio, transcribe_segments, diarize_segments, load_vad_info, summarize_text,
+                       text_to_speech, save_to_database, WHISPER_MODEL_NAME, SUMMARIZER_MODEL_NAME, VAD_ENABLED)
+from inference import INFERENCE_MODE
+from diarization import DIARIZATION_ENABLED, DIARIZATION_SPEAKERS, DIARIZATION_MAX_SPEAKERS
+
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "./app/jobs.db")
+
+# Number of workers per stage. Preprocessing and diarization run in process
+# pools, Whisper and BART each have a single model-owning thread, and TTS and database writes
+# mostly wait on I/O so they get several threads.
+STAGE_CONCURRENCY = {
+    "fingerprint": int(os.environ.get("JOB_CONCURRENCY_FINGERPRINT", "2")),
+    "preprocess": int(os.environ.get("JOB_CONCURRENCY_PREPROCESS", "2")),
+    "transcribe": int(os.environ.get("JOB_CONCURRENCY_TRANSCRIBE", "1")),
+    "diarize": int(os.environ.get("JOB_CONCURRENCY_DIARIZE", "1")),
+    "summarize": int(os.environ.get("JOB_CONCURRENCY_SUMMARIZE", "1")),
+    "tts": int(os.environ.get("JOB_CONCURRENCY_TTS", "4")),
+    "database": int(os.environ.get("JOB_CONCURRENCY_DATABASE", "4")),
+}
+
+STAGE_KINDS = {
+    "fingerprint": "thread",
+    "preprocess": "process",
+    "transcribe": "thread",
+    "diarize": "process",
+    "summarize": "thread",
+    "tts": "thread",
+    "database": "thread",
+}
+
+# Every JobManager records a heartbeat this often. Unfinished jobs whose owner
+# has not done so for JOB_OWNER_TIMEOUT_SECONDS (its process crashed, was
+# killed or was recycled) are taken over by another manager sharing the store.
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_OWNER_TIMEOUT_SECONDS = float(os.environ.get("JOB_OWNER_TIMEOUT_SECONDS", "30"))
+
+# Maximum number of jobs waiting in front of each stage after the first.
+STAGE_QUEUE_SIZE = int(os.environ.get("JOB_STAGE_QUEUE_SIZE", "4"))
+
+STAGES = ["fingerprint", "preprocess", "transcribe", "diarize", "summarize", "tts", "database"]
+
+# Bump when a change to a stage alters its results, so cached results made by
+# the previous code are no longer served.
+PIPELINE_VERSION = 1
+
+
+def pipeline_config():
+    """
+    Everything besides the recording that a job's result depends on, as the
+    configuration tag of the result cache.
+    """
+    return json.dumps({
+        "version": PIPELINE_VERSION,
+        "inference_mode": INFERENCE_MODE,
+        "whisper": WHISPER_MODEL_NAME,
+        "summarizer": SUMMARIZER_MODEL_NAME,
+        "vad": VAD_ENABLED,
+        "diarization": [DIARIZATION_ENABLED, DIARIZATION_SPEAKERS, DIARIZATION_MAX_SPEAKERS],
+    }, sort_keys=True)
+
+
+def _run_fingerprint(job):
+    return {"pcm_hash": hash_pcm(job["file_path"])}
+
+def preprocess_audio(file_path, source=None):
+    """
+    Output of the preprocess stage for file_path (see process_audio).
+    """
+    processed_audio = process_audio(file_path, source)
+    vad_info = load_vad_info(processed_audio)
+    vad_info.pop("timeline")
+    return {"processed_audio": processed_audio, "vad": vad_info}
+
+def _run_preprocess(job):
+    if "processed_audio" in job["result"]:
+        # Already preprocessed while the file was being uploaded.
+        return {}
+    return preprocess_audio(job["file_path"])
+
+def _run_transcribe(job):
+    started = time.time()
+    try:
+        transcription, segments = transcribe_segments(job["result"]["processed_audio"])
+    except Exception as e:
+        raise RuntimeError(f"Error transcribing audio: {str(e)}")
+    output = {"transcription": transcription, "segments": segments}
+    vad_info = job["result"].get("vad")
+    if vad_info and vad_info["speech_seconds"] > 0:
+        # Whisper time scales with audio length, so skipped audio would have cost
+        # the same per second as the speech that was transcribed.
+        per_second = (time.time() - started) / vad_info["speech_seconds"]
+        output["vad"] = dict(vad_info, estimated_seconds_saved=round(per_second * vad_info["skipped_seconds"], 2))
+    return output
+
+def _run_diarize(job):
+    result = job["result"]
+    if not DIARIZATION_ENABLED or not result.get("segments"):
+        return {}
+    try:
+        segments, speakers = diarize_segments(result["processed_audio"], result["segments"])
+    except Exception as e:
+        raise RuntimeError(f"Error diarizing audio: {str(e)}")
+    return {"segments": segments, "speakers": speakers}
+
+def _run_summarize(job):
+    summary, key_points = summarize_text(job["result"]["transcription"])
+    return {"summary": summary, "key_points": key_points}
+
+def _run_tts(job):
+    output_file = os.path.splitext(job["file_path"])[0] + "_summary.mp3"
+    return {"audio_summary_file": text_to_speech(job["result"]["summary"], output_file)}
+
+def _run_database(job):
+    result = job["result"]
+    save_to_database(job["filename"], result["transcription"], result["summary"], result["key_points"],
+                     result.get("segments"))
+    return {}
+
+STAGE_FUNCTIONS = {
+    "fingerprint": _run_fingerprint,
+    "preprocess": _run_preprocess,
+    "transcribe": _run_transcribe,
+    "diarize": _run_diarize,
+    "summarize": _run_summarize,
+    "tts": _run_tts,
+    "database": _run_database,
+}
+
+
+class _StageRunner:
+    """
+    Runs a stage function for a job and returns (output, observations), where
+    observations are the metrics recorded during the run. Stages that run in a
+    worker process record into that process, so the parent replays them.
+    Jobs submitted with profile=True get a cProfile dump per stage in
+    PROFILE_DIR/<job id>/<stage>.prof.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, job):
+        profile_path = os.path.join(PROFILE_DIR, job["id"], f"{self.name}.prof") if job.get("profile") else None
+        with stage_metrics.capture() as observations, profiled(profile_path):
+            output = STAGE_FUNCTIONS[self.name](job)
+        return output, observations
+
+
+class JobStore:
+    """
+    SQLite-backed store for job state, so queued work survives a restart.
+    Every process opens its own connection, so the store can be created before
+    a preforking server forks its workers and then be shared by them.
+    """
+
+    def __init__(self, db_path=JOB_DB_PATH):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT,
+                    file_path TEXT,
+                    content_hash TEXT,
+                    profile INTEGER DEFAULT 0,
+                    status TEXT,
+                    stages TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    updated_at REAL
+                )
+            """)
+            columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+            if "content_hash" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+            if "profile" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN profile INTEGER DEFAULT 0")
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS owners (id TEXT PRIMARY KEY, heartbeat REAL)")
+
+    @property
+    def _conn(self):
+        # A sqlite connection must not be used across fork().
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._connection.row_factory = sqlite3.Row
+            self._pid = os.getpid()
+        return self._connection
+
+    def create(self, filename, file_path, content_hash=None, status="queued", stages=None, result=None,
+               profile=False, owner=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        stages = stages or {name: "pending" for name in STAGES}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, filename, file_path, content_hash, profile, status, stages, result, error, "
+                "owner, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?, ?)",
+                (job_id, filename, file_path, content_hash, int(profile), status, json.dumps(stages),
+                 json.dumps(result or {}), owner, now, now),
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        stages = json.loads(job["stages"])
+        # Jobs created before a stage was added treat it as already done.
+        job["stages"] = {name: stages.get(name, "done") for name in STAGES}
+        job["result"] = json.loads(job["result"])
+        return job
+
+    def update(self, job_id, **fields):
+        if "stages" in fields:
+            fields["stages"] = json.dumps(fields["stages"])
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def heartbeat(self, owner):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO owners (id, heartbeat) VALUES (?, ?)", (owner, time.time()))
+
+    def remove_owner(self, owner):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM owners WHERE id = ?", (owner,))
+
+    def claim_orphans(self, owner, timeout=JOB_OWNER_TIMEOUT_SECONDS):
+        """
+        Takes over the unfinished jobs whose owner has not sent a heartbeat
+        within timeout seconds (or that have no owner), oldest first, and
+        returns their ids. Each job is claimed by a single conditional update,
+        so concurrent callers never claim the same job.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, owner FROM jobs WHERE status IN ('queued', 'running') AND (owner IS NULL OR owner NOT IN "
+                "(SELECT id FROM owners WHERE heartbeat >= ?)) ORDER BY created_at",
+                (time.time() - timeout,),
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                with self._conn:
+                    cursor = self._conn.execute(
+                        "UPDATE jobs SET owner = ?, updated_at = ? WHERE id = ? AND owner IS ?",
+                        (owner, time.time(), row["id"], row["owner"]),
+                    )
+                if cursor.rowcount:
+                    claimed.append(row["id"])
+        return claimed
+
+
+class JobManager:
+    """
+    Runs uploaded files through the processing stages in the background.
+
+    The stages form a StagedPipeline, so while one job is in Whisper the next
+    one can already be denoised and an earlier one can be in TTS. Progress and
+    intermediate results are persisted after each stage. Every job is owned by
+    the manager that runs it, and unfinished jobs whose owner stopped sending
+    heartbeats (after a restart, or when a server worker died) are resumed from
+    their first incomplete stage by any manager sharing the store.
+
+    Finished results go into a content-addressed ResultCache. An upload whose
+    raw bytes are already cached completes at submit time, and one whose decoded
+    PCM matches a cached recording is completed right after fingerprinting.
+    """
+
+    def __init__(self, store=None, concurrency=None, cache=None):
+        self.store = store or JobStore()
+        self.cache = cache or ResultCache(config=pipeline_config())
+        concurrency = concurrency or STAGE_CONCURRENCY
+        stages = [
+            Stage(
+                name,
+                _StageRunner(name),
+                workers=concurrency[name],
+                kind=STAGE_KINDS[name],
+                # New uploads are already persisted, so the intake queue is unbounded.
+                queue_size=0 if name == STAGES[0] else STAGE_QUEUE_SIZE,
+            )
+            for name in STAGES
+        ]
+        self.pipeline = StagedPipeline(
+            stages,
+            on_start=self._on_stage_start,
+            on_done=self._on_stage_done,
+            on_error=self._on_stage_error,
+            on_complete=self._on_complete,
+        )
+        self._started = False
+        self._preprocessed = {}
+        self.owner = uuid.uuid4().hex
+
+    def start(self):
+        """
+        Starts the stage workers and a thread that sends this manager's
+        heartbeat and resumes orphaned jobs.
+        """
+        if self._started:
+            return
+        self._started = True
+        self.store.heartbeat(self.owner)
+        self.pipeline.start()
+        threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+
+    def _heartbeat_loop(self):
+        while True:
+            try:
+                self.store.heartbeat(self.owner)
+                self._resume()
+            except Exception as e:
+                print(f"Could not resume orphaned jobs: {e}")
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+
+    def _resume(self):
+        for job_id in self.store.claim_orphans(self.owner):
+            job = self.store.get(job_id)
+            next_stage = next((name for name in STAGES if job["stages"][name] != "done"), None)
+            if next_stage is None:
+                self.store.update(job_id, status="done")
+            else:
+                self.pipeline.submit(job, next_stage)
+
+    def submit(self, filename, file_path, content_hash=None, profile=False, preprocessed=None):
+        """
+        Queues an uploaded file. preprocessed, if given, is the preprocess
+        stage's output already being computed (e.g. an EarlyPreprocess of the
+        upload), whose result() the stage then waits for instead.
+        """
+        cached = self.cache.get(content_hash) if content_hash else None
+        if cached is not None:
+            return self.store.create(
+                filename, file_path, content_hash, status="done",
+                stages={name: "cached" for name in STAGES}, result=cached,
+            )
+        job_id = self.store.create(filename, file_path, content_hash, profile=profile, owner=self.owner)
+        if preprocessed is not None:
+            self._preprocessed[job_id] = preprocessed
+        self.pipeline.submit(self.store.get(job_id))
+        return job_id
+
+    def submit_transcribed(self, filename, file_path, transcription, segments=None):
+        """
+        Queues a recording that was already transcribed (e.g. by a live streaming
+        session) with its timed segments, so that only diarization,
+        summarization, TTS and the database write run.
+        """
+        first = STAGES.index("diarize")
+        stages = {name: "done" if i < first else "pending" for i, name in enumerate(STAGES)}
+        result = {"processed_audio": file_path, "transcription": transcription, "segments": segments or []}
+        job_id = self.store.create(filename, file_path, stages=stages, result=result, owner=self.owner)
+        self.pipeline.submit(self.store.get(job_id), STAGES[first])
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _on_stage_start(self, job, stage):
+        job["stages"][stage] = "running"
+        job["status"] = "running"
+        self.store.update(job["id"], status="running", stages=job["stages"])
+        preprocessed = self._preprocessed.pop(job["id"], None) if stage == "preprocess" else None
+        if preprocessed is not None:
+            try:
+                job["result"].update(preprocessed.result())
+            except Exception as e:
+                print(f"Job {job['id']}: early preprocessing failed, starting over: {e}")
+
+    def _on_stage_done(self, job, stage, output):
+        output, observations = output
+        if STAGE_KINDS[stage] == "process":
+            stage_metrics.replay(observations)
+        job["result"].update(output)
+        job["stages"][stage] = "done"
+        if stage == "fingerprint":
+            cached = self.cache.get(output["pcm_hash"])
+            if cached is not None:
+                self._preprocessed.pop(job["id"], None)
+                stages = {name: job["stages"][name] if name == stage else "cached" for name in STAGES}
+                self.store.update(job["id"], status="done", stages=stages, result=cached)
+                if job["content_hash"]:
+                    self.cache.add_alias(job["content_hash"], output["pcm_hash"])
+                return None
+        self.store.update(job["id"], stages=job["stages"], result=job["result"])
+        return job
+
+    def _on_stage_error(self, job, stage, exc):
+        self._preprocessed.pop(job["id"], None)
+        job["stages"][stage] = "failed"
+        self.store.update(job["id"], status="failed", stages=job["stages"], error=str(exc))
+        print(f"Job {job['id']} failed in stage '{stage}': {exc}")
+
+    def _on_complete(self, job):
+        self.store.update(job["id"], status="done")
+        if "pcm_hash" not in job["result"]:
+            return
+        aliases = [job["content_hash"]] if job["content_hash"] else []
+        try:
+            self.cache.put(job["result"]["pcm_hash"], job["result"], aliases=aliases)
+        except Exception as e:
+            print(f"Could not cache result of job {job['id']}: {e}")
+
+    def release_jobs(self):
+        """
+        Stops claiming this manager's unfinished jobs, so that another manager
+        takes them over at its next heartbeat instead of after the timeout.
+        """
+        self.store.remove_owner(self.owner)
+
+    def shutdown(self):
+        self.release_jobs()
+        self.pipeline.shutdown()
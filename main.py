@@ -1,15 +1,58 @@
-import os
-import threading
-import time
-def run_flask():
-    os.system("python app.py")
-
-def run_kivy():
-    os.system("python MeetingAssistant.py")
-
-if __name__ == '__main__':
-    flask_thread = threading.Thread(target=run_flask)
-    flask_thread.start()
-    time.sleep(5)  # Wait 5 seconds for the backend to start
-    kivy_thread = threading.Thread(target=run_kivy)
-    kivy_thread.start()
\ No newline at end of file
+import os
+import sys
+import json
+import time
+import subprocess
+import urllib.request
+import urllib.error
+
+# The same setting MeetingAssistant.py reads, so both talk to one backend.
+API_URL = os.environ.get("API_URL", f"http://127.0.0.1:{os.environ.get('PORT', 5000)}")
+BACKEND_READY_URL = f"{API_URL}/readyz"
+BACKEND_READY_TIMEOUT = float(os.environ.get("BACKEND_READY_TIMEOUT", "600"))
+BACKEND_POLL_INTERVAL = 0.5
+
+def run_flask():
+    return subprocess.Popen([sys.executable, "app.py"])
+
+def run_kivy():
+    os.system("python MeetingAssistant.py")
+
+def wait_for_backend(backend=None):
+    """
+    Polls the backend's /readyz until it reports ready. Returns False if it
+    failed to start, exited, or did not become ready within
+    BACKEND_READY_TIMEOUT.
+    """
+    deadline = time.time() + BACKEND_READY_TIMEOUT
+    while time.time() < deadline:
+        if backend is not None and backend.poll() is not None:
+            print(f"Backend exited with code {backend.returncode}.")
+            return False
+        try:
+            with urllib.request.urlopen(BACKEND_READY_URL, timeout=2):
+                return True
+        except urllib.error.HTTPError as e:
+            # 503 while starting up; give up early if startup failed.
+            try:
+                status = json.loads(e.read() or b"{}")
+            except ValueError:
+                status = {}
+            if status.get("startup", {}).get("error"):
+                print(f"Backend failed to start: {status['startup']['error']}")
+                return False
+        except (urllib.error.URLError, OSError):
+            # Not listening yet.
+            pass
+        time.sleep(BACKEND_POLL_INTERVAL)
+    print("Backend did not become ready in time.")
+    return False
+
+if __name__ == '__main__':
+    backend = run_flask()
+    if not wait_for_backend(backend):
+        backend.terminate()
+        backend.wait()
+        sys.exit(1)
+    run_kivy()
+    backend.wait()
@@ -0,0 +1,290 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+# Whether requests may ask for a cProfile dump with ?profile=1, and where the
+# dumps are written (see profiled()).
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./app/profiles")
+
+# Histogram buckets for stage wall and CPU time, in seconds.
+TIME_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Buckets for the real-time factor: seconds of audio handled per second.
+RTF_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+# How often resident memory is sampled while a stage runs.
+RSS_SAMPLE_SECONDS = float(os.environ.get("RSS_SAMPLE_SECONDS", "0.05"))
+
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process so far, or 0 if unknown.
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes():
+    """
+    Returns the current resident set size of this process, or 0 if unknown
+    (/proc is Linux only).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+class _RssSampler:
+    """
+    Samples resident memory in the background while any StageTimer section is
+    running and hands every sample to the running timers, so each one sees the
+    high-water mark of its own sections rather than of the process lifetime.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self._reset()
+
+    def _reset(self):
+        # Also runs in a forked child, where the parent's thread and running
+        # timers do not exist.
+        self._lock = threading.Lock()
+        self._timers = set()
+        self._active = threading.Event()
+        self._thread = None
+
+    def add(self, timer):
+        with self._lock:
+            self._timers.add(timer)
+            self._active.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, timer):
+        with self._lock:
+            self._timers.discard(timer)
+            if not self._timers:
+                self._active.clear()
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            rss = current_rss_bytes()
+            with self._lock:
+                timers = list(self._timers)
+            for timer in timers:
+                timer.sample_rss(rss)
+            time.sleep(self.interval)
+
+
+_rss_sampler = _RssSampler()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_rss_sampler._reset)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StageTimer:
+    """
+    Accumulates wall and CPU time over one or more timed sections of a stage,
+    e.g. every block that passes through the denoiser during one file.
+    CPU time is process-wide, so it includes model threads (and any other work
+    running concurrently). The same goes for rss_growth, the highest resident
+    memory sampled during the sections minus the memory when the first began.
+    """
+
+    def __init__(self, audio_seconds=None):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.audio_seconds = audio_seconds
+        self.rss_start = None
+        self.rss_peak = 0
+
+    @property
+    def rss_growth(self):
+        return max(self.rss_peak - self.rss_start, 0) if self.rss_start is not None else 0
+
+    def sample_rss(self, rss):
+        self.rss_peak = max(self.rss_peak, rss)
+
+    @contextmanager
+    def time(self):
+        rss = current_rss_bytes()
+        if self.rss_start is None:
+            self.rss_start = rss
+        self.sample_rss(rss)
+        _rss_sampler.add(self)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield self
+        finally:
+            self.wall += time.perf_counter() - wall
+            self.cpu += time.process_time() - cpu
+            _rss_sampler.remove(self)
+            self.sample_rss(current_rss_bytes())
+
+    def iterate(self, iterable):
+        """
+        Yields from iterable, timing only the work of producing each item.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.time():
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+
+class StageMetrics:
+    """
+    Process-wide latency, CPU, memory and real-time-factor statistics per
+    pipeline stage, rendered in the Prometheus text format by render().
+
+    Observations made while capture() is active on the current thread are also
+    collected, so that a stage run in a worker process can hand them back to
+    the parent for replay().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wall = {}
+        self._cpu = {}
+        self._rtf = {}
+        self._rss_growth = {}
+        self._local = threading.local()
+
+    def observe(self, stage, wall, cpu, audio_seconds=None, rss_growth=None):
+        self._record(stage, wall, cpu, audio_seconds, rss_growth)
+        captured = getattr(self._local, "captured", None)
+        if captured is not None:
+            captured.append((stage, wall, cpu, audio_seconds, rss_growth))
+
+    def _record(self, stage, wall, cpu, audio_seconds, rss_growth):
+        with self._lock:
+            self._wall.setdefault(stage, Histogram(TIME_BUCKETS)).observe(wall)
+            self._cpu.setdefault(stage, Histogram(TIME_BUCKETS)).observe(cpu)
+            if audio_seconds and wall > 0:
+                self._rtf.setdefault(stage, Histogram(RTF_BUCKETS)).observe(audio_seconds / wall)
+            if rss_growth:
+                self._rss_growth[stage] = max(self._rss_growth.get(stage, 0), rss_growth)
+
+    def record(self, stage, timer):
+        """
+        Records a finished StageTimer, skipping stages that never ran.
+        """
+        if timer.wall > 0:
+            self.observe(stage, timer.wall, timer.cpu, timer.audio_seconds, timer.rss_growth)
+
+    @contextmanager
+    def measure(self, stage, audio_seconds=None):
+        """
+        Times the body as one run of stage. The yielded StageTimer's
+        audio_seconds can be set inside the body once the duration is known.
+        """
+        timer = StageTimer(audio_seconds)
+        try:
+            with timer.time():
+                yield timer
+        finally:
+            self.record(stage, timer)
+
+    @contextmanager
+    def capture(self):
+        """
+        Yields a list that collects the observations made on this thread until
+        the block exits.
+        """
+        previous = getattr(self._local, "captured", None)
+        self._local.captured = []
+        try:
+            yield self._local.captured
+        finally:
+            self._local.captured = previous
+
+    def replay(self, observations):
+        """
+        Records observations captured in another process.
+        """
+        for observation in observations:
+            self._record(*observation)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            _render_histograms(lines, "meeting_stage_wall_seconds", "Wall time per pipeline stage run.",
+                               self._wall)
+            _render_histograms(lines, "meeting_stage_cpu_seconds",
+                               "Process CPU time while a pipeline stage ran.", self._cpu)
+            _render_histograms(lines, "meeting_stage_realtime_factor",
+                               "Seconds of audio handled per second of wall time.", self._rtf)
+            lines.append("# HELP meeting_stage_rss_growth_bytes Largest rise in process resident memory "
+                         "during one run of a stage.")
+            lines.append("# TYPE meeting_stage_rss_growth_bytes gauge")
+            for stage, value in sorted(self._rss_growth.items()):
+                lines.append(f'meeting_stage_rss_growth_bytes{{stage="{stage}"}} {value}')
+        lines.append("# HELP meeting_process_peak_rss_bytes Peak resident memory of this process.")
+        lines.append("# TYPE meeting_process_peak_rss_bytes gauge")
+        lines.append(f"meeting_process_peak_rss_bytes {peak_rss_bytes()}")
+        return "\n".join(lines) + "\n"
+
+
+def _render_histograms(lines, name, help_text, histograms):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for stage, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+
+@contextmanager
+def profiled(path):
+    """
+    Runs the body under cProfile and writes the stats to path (a pstats file,
+    readable with pstats, snakeviz or flameprof). Does nothing if path is None.
+    """
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}")
+
+
+stage_metrics = StageMetrics()
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+import gc
+from contextlib import contextmanager
+
+# Seconds a model may sit unused before it is unloaded. 0 disables eviction.
+IDLE_EVICTION_SECONDS = float(os.environ.get("MODEL_IDLE_EVICTION_SECONDS", "0"))
+# How often the background reaper checks for idle models.
+EVICTION_CHECK_INTERVAL = float(os.environ.get("MODEL_EVICTION_CHECK_INTERVAL", "60"))
+
+
+class ModelRegistry:
+    """
+    Process-wide registry that loads each model once and shares it across threads.
+
+    Models are registered with a loader (and an optional warm-up function) and are
+    loaded on first use or by warm_up(). Access goes through use(), which holds a
+    per-model lock so that inference calls from Flask worker threads never overlap
+    and a model is never evicted while it is being used. With an idle timeout, a
+    reaper thread started by the first load evicts models that go unused.
+    """
+
+    def __init__(self, idle_timeout=IDLE_EVICTION_SECONDS, check_interval=EVICTION_CHECK_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._loaders = {}
+        self._warmers = {}
+        self._models = {}
+        # Models loaded by preload() that have not been warmed yet.
+        self._cold = set()
+        self._last_used = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def register(self, name, loader, warmer=None):
+        """
+        Registers a model loader. The warmer, if given, is called with the freshly
+        loaded model so the first real request does not pay for lazy initialisation.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._warmers[name] = warmer
+            self._locks.setdefault(name, threading.RLock())
+
+    def _load(self, name, warm=True):
+        # Caller must hold the model lock.
+        model = self._models.get(name)
+        if model is None or (warm and name in self._cold):
+            if name not in self._loaders:
+                raise KeyError(f"No model registered under '{name}'")
+            started = time.time()
+            if model is None:
+                model = self._loaders[name]()
+            warmer = self._warmers.get(name)
+            if warm and warmer is not None:
+                warmer(model)
+            self._models[name] = model
+            if warm:
+                self._cold.discard(name)
+                self._start_reaper()
+            else:
+                # Preloading happens in a preforking server's master, whose
+                # threads would not survive the fork.
+                self._cold.add(name)
+            print(f"{'Loaded' if warm else 'Preloaded'} model '{name}' in {time.time() - started:.2f}s")
+        self._last_used[name] = time.monotonic()
+        return model
+
+    @contextmanager
+    def use(self, name):
+        """
+        Yields the named model, loading it if needed, while holding its lock.
+        """
+        lock = self._locks.get(name)
+        if lock is None:
+            raise KeyError(f"No model registered under '{name}'")
+        with lock:
+            model = self._load(name)
+            try:
+                yield model
+            finally:
+                self._last_used[name] = time.monotonic()
+
+    def is_loaded(self, name):
+        return self._models.get(name) is not None
+
+    def status(self):
+        """
+        Returns {name: loaded} for every registered model.
+        """
+        return {name: self.is_loaded(name) for name in list(self._loaders)}
+
+    def warm_up(self, names=None):
+        """
+        Loads and warms the given models (all registered models by default).
+        """
+        for name in names or list(self._loaders):
+            with self._locks[name]:
+                self._load(name)
+
+    def preload(self, names=None):
+        """
+        Loads the given models (all registered models by default) without
+        warming them. Meant for the master process of a preforking server:
+        workers forked afterwards share the weights copy-on-write, whereas
+        running inference before the fork would start thread pools that do not
+        survive it. warm_up() in each worker then only runs the warmers.
+        """
+        for name in names or list(self._loaders):
+            with self._locks[name]:
+                self._load(name, warm=False)
+
+    def evict(self, name):
+        """
+        Drops the named model so its memory can be reclaimed. Returns False if the
+        model is currently in use.
+        """
+        lock = self._locks.get(name)
+        if lock is None or not lock.acquire(blocking=False):
+            return False
+        try:
+            self._cold.discard(name)
+            if self._models.pop(name, None) is None:
+                return True
+            self._last_used.pop(name, None)
+        finally:
+            lock.release()
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        print(f"Evicted idle model '{name}'")
+        return True
+
+    def evict_idle(self):
+        """
+        Evicts every model that has not been used for longer than idle_timeout.
+        """
+        if self.idle_timeout <= 0:
+            return
+        now = time.monotonic()
+        for name, last_used in list(self._last_used.items()):
+            if now - last_used > self.idle_timeout:
+                self.evict(name)
+
+    def _start_reaper(self):
+        # Started by the first model load, whether from warm_up() or lazily
+        # from use(), if eviction is enabled.
+        def reap():
+            while True:
+                time.sleep(self.check_interval)
+                self.evict_idle()
+
+        with self._lock:
+            if self.idle_timeout <= 0 or self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+
+registry = ModelRegistry()
@@ -0,0 +1,431 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+from metrics import stage_metrics
+from request_limiter import MAX_ACTIVE_REQUESTS
+
+# Which backend stores meetings: "mysql" or "sqlite" (tests, single-node setups).
+DB_BACKEND = os.environ.get("DB_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "./app/meetings.db")
+
+# MySQL configuration – update these values if needed
+DB_CONFIG = {
+    'host': 'localhost',      # Use your MySQL host
+    'port': 3307,             # Use your MySQL port
+    'user': 'root',
+    'password': 'password',
+    'database': 'Meeting_Assistant',
+}
+# Enough connections for every request a process admits (see request_limiter.py)
+# plus the write-behind thread; mysql-connector allows at most 32 per pool.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", str(min(MAX_ACTIVE_REQUESTS + 1, 32))))
+# Longest a caller waits for a free pooled connection before DatabaseBusyError.
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_POOL_POLL_SECONDS = 0.05
+
+# Write-behind settings: rows are grouped into one multi-row INSERT of up to
+# WRITE_BATCH_SIZE rows, waiting at most WRITE_FLUSH_SECONDS for a batch to fill.
+WRITE_BATCH_SIZE = int(os.environ.get("DB_WRITE_BATCH_SIZE", "50"))
+WRITE_FLUSH_SECONDS = float(os.environ.get("DB_WRITE_FLUSH_SECONDS", "0.2"))
+
+# Schema migrations, applied in order and recorded in schema_version.
+MIGRATIONS = [
+    (1, {
+        "mysql": ["""
+            CREATE TABLE IF NOT EXISTS audio_data (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                filename VARCHAR(255),
+                transcription TEXT,
+                summary TEXT,
+                key_points TEXT,
+                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """],
+        "sqlite": ["""
+            CREATE TABLE IF NOT EXISTS audio_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename VARCHAR(255),
+                transcription TEXT,
+                summary TEXT,
+                key_points TEXT,
+                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """],
+    }),
+    (2, {
+        # Full-text search over transcription, summary and key points.
+        "mysql": [
+            "ALTER TABLE audio_data ADD FULLTEXT INDEX audio_data_fulltext (transcription, summary, key_points)",
+        ],
+        "sqlite": [
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS audio_data_fts USING fts5(
+                transcription, summary, key_points, content='audio_data', content_rowid='id'
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS audio_data_fts_insert AFTER INSERT ON audio_data BEGIN
+                INSERT INTO audio_data_fts (rowid, transcription, summary, key_points)
+                VALUES (new.id, new.transcription, new.summary, new.key_points);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS audio_data_fts_delete AFTER DELETE ON audio_data BEGIN
+                INSERT INTO audio_data_fts (audio_data_fts, rowid, transcription, summary, key_points)
+                VALUES ('delete', old.id, old.transcription, old.summary, old.key_points);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS audio_data_fts_update AFTER UPDATE ON audio_data BEGIN
+                INSERT INTO audio_data_fts (audio_data_fts, rowid, transcription, summary, key_points)
+                VALUES ('delete', old.id, old.transcription, old.summary, old.key_points);
+                INSERT INTO audio_data_fts (rowid, transcription, summary, key_points)
+                VALUES (new.id, new.transcription, new.summary, new.key_points);
+            END
+            """,
+            "INSERT INTO audio_data_fts (audio_data_fts) VALUES ('rebuild')",
+        ],
+    }),
+    (3, {
+        # Speaker-attributed transcript segments, stored as JSON.
+        "mysql": ["ALTER TABLE audio_data ADD COLUMN segments LONGTEXT"],
+        "sqlite": ["ALTER TABLE audio_data ADD COLUMN segments TEXT"],
+    }),
+]
+
+# Errors for a table, column or index that already exists (1050, 1060, 1061).
+MYSQL_ALREADY_APPLIED_ERRORS = {1050, 1060, 1061}
+
+MEETING_COLUMNS = ("filename", "transcription", "summary", "key_points", "segments")
+
+# Characters of the transcription included in list and search results.
+PREVIEW_CHARS = 200
+
+# Columns read for a single meeting, and for list and search results, which
+# only need a preview of the transcription and no segments.
+MEETING_SELECT = "id, filename, transcription, summary, key_points, segments, upload_time"
+PREVIEW_SELECT = f"id, filename, SUBSTR(transcription, 1, {PREVIEW_CHARS}), summary, key_points, NULL, upload_time"
+
+
+class DatabaseBusyError(RuntimeError):
+    """
+    Raised when no database connection became free in time.
+    """
+
+
+class MySQLBackend:
+    name = "mysql"
+    placeholder = "%s"
+
+    def search_clause(self, query):
+        return ("MATCH (transcription, summary, key_points) AGAINST (%s IN NATURAL LANGUAGE MODE)", query)
+
+    def __init__(self, config=None, pool_size=DB_POOL_SIZE):
+        from mysql.connector import pooling
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name="meeting_assistant", pool_size=pool_size, **(config or DB_CONFIG)
+        )
+
+    def connect(self, timeout=DB_POOL_TIMEOUT_SECONDS):
+        # Closing a pooled connection returns it to the pool. The pool raises
+        # at once when it is empty, so wait for another caller to return one.
+        from mysql.connector.errors import PoolError
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self._pool.get_connection()
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    raise DatabaseBusyError("No database connection became free in time")
+                time.sleep(DB_POOL_POLL_SECONDS)
+
+    @contextmanager
+    def migration(self, conn, cursor):
+        # Every gunicorn worker migrates on startup; a named lock makes the
+        # others wait and then find the migrations already recorded.
+        cursor.execute("SELECT GET_LOCK('meeting_assistant_migrations', 120)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for the database migration lock")
+        try:
+            yield
+            conn.commit()
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('meeting_assistant_migrations')")
+            cursor.fetchone()
+
+    def apply(self, cursor, statement):
+        # MySQL commits DDL implicitly, so a migration interrupted before its
+        # version was recorded may already have created its column or index.
+        from mysql.connector import Error
+        try:
+            cursor.execute(statement)
+        except Error as e:
+            if e.errno not in MYSQL_ALREADY_APPLIED_ERRORS:
+                raise
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    placeholder = "?"
+
+    def search_clause(self, query):
+        # Quote every term so user input is never parsed as FTS5 query syntax.
+        terms = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+        return ("id IN (SELECT rowid FROM audio_data_fts WHERE audio_data_fts MATCH ?)", terms)
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+
+    @contextmanager
+    def migration(self, conn, cursor):
+        # DDL is transactional in SQLite, so one exclusive transaction both
+        # serializes concurrent migrations and makes each run all-or-nothing.
+        cursor.execute("BEGIN EXCLUSIVE")
+        try:
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def apply(self, cursor, statement):
+        cursor.execute(statement)
+
+    def connect(self):
+        # One connection per thread, kept open for the life of the thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = _KeepOpen(conn)
+        return self._local.conn
+
+
+class _KeepOpen:
+    """
+    Wraps a sqlite3 connection so that close() is a no-op, matching the
+    "close returns it to the pool" usage of pooled MySQL connections.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        pass
+
+
+def create_backend(name=DB_BACKEND):
+    if name == "mysql":
+        return MySQLBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"Unknown database backend '{name}'")
+
+
+class Database:
+    """
+    Persistence layer for meeting records.
+
+    The schema is migrated once when the database is started. Inserts go through
+    a write-behind buffer: a background thread collects queued rows and writes
+    them with a single executemany per batch, on a connection borrowed from the
+    backend's pool.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or create_backend()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._writer is not None:
+                return
+            self.migrate()
+            self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+            self._writer.start()
+
+    def migrate(self):
+        """
+        Applies pending schema migrations. Concurrent callers, such as gunicorn
+        workers starting together, are serialized by the backend, and each
+        reads the current version only once it holds the migration lock.
+        """
+        conn = self.backend.connect()
+        try:
+            cursor = conn.cursor()
+            with self.backend.migration(conn, cursor):
+                cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT PRIMARY KEY)")
+                cursor.execute("SELECT MAX(version) FROM schema_version")
+                current = cursor.fetchone()[0] or 0
+                for version, statements in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    for statement in statements[self.backend.name]:
+                        self.backend.apply(cursor, statement)
+                    cursor.execute(
+                        f"INSERT INTO schema_version (version) VALUES ({self.backend.placeholder})", (version,)
+                    )
+                    print(f"Applied database migration {version}")
+            cursor.close()
+        finally:
+            conn.close()
+
+    def _select(self, where, params, limit, columns=MEETING_SELECT):
+        conn = self.backend.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {columns} FROM audio_data "
+                f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+                f"ORDER BY id DESC LIMIT {int(limit)}",
+                params,
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        return [_meeting_from_row(row) for row in rows]
+
+    def list_meetings(self, limit=20, before_id=None, query=None):
+        """
+        Returns a page of meetings, newest first, and the before_id to pass for
+        the next page (None on the last page). Pagination is keyset-based on the
+        primary key, so every page costs the same regardless of its depth. With
+        a query, only meetings matching it in the full-text index are returned.
+        """
+        self.start()
+        where, params = [], []
+        if query:
+            clause, param = self.backend.search_clause(query)
+            where.append(clause)
+            params.append(param)
+        if before_id is not None:
+            where.append(f"id < {self.backend.placeholder}")
+            params.append(before_id)
+        meetings = self._select(where, params, limit + 1, PREVIEW_SELECT)
+        next_before_id = meetings[limit - 1]["id"] if len(meetings) > limit else None
+        for meeting in meetings:
+            meeting["transcription_preview"] = meeting.pop("transcription")
+            del meeting["segments"]
+        return meetings[:limit], next_before_id
+
+    def get_meeting(self, meeting_id):
+        self.start()
+        meetings = self._select([f"id = {self.backend.placeholder}"], [meeting_id], 1)
+        return meetings[0] if meetings else None
+
+    def save_meeting(self, filename, transcription, summary, key_points, segments=None, wait=True):
+        """
+        Queues a meeting record for insertion. segments are the transcript's
+        timed (and speaker-attributed) segments, if known. With wait=True, blocks until the
+        batch containing it has been committed and re-raises any write error.
+        Returns a Future that resolves once the row is written.
+        """
+        self.start()
+        future = Future()
+        row = (filename, transcription, summary, "; ".join(key_points), json.dumps(segments) if segments else None)
+        self._queue.put((row, future))
+        if wait:
+            future.result()
+        return future
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + WRITE_FLUSH_SECONDS
+            while len(batch) < WRITE_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        # Entries without a row are flush() markers; they resolve once the rows
+        # queued before them are written.
+        markers = [future for row, future in batch if row is None]
+        batch = [(row, future) for row, future in batch if row is not None]
+        if batch:
+            self._insert(batch)
+        for marker in markers:
+            marker.set_result(None)
+
+    def _insert(self, batch):
+        placeholders = ", ".join([self.backend.placeholder] * len(MEETING_COLUMNS))
+        query = f"INSERT INTO audio_data ({', '.join(MEETING_COLUMNS)}) VALUES ({placeholders})"
+        conn = None
+        try:
+            with stage_metrics.measure("database"):
+                conn = self.backend.connect()
+                cursor = conn.cursor()
+                cursor.executemany(query, [row for row, _ in batch])
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            error = RuntimeError(f"Error writing to the {self.backend.name} database: {e}")
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        finally:
+            if conn is not None:
+                conn.close()
+        print(f"Saved {len(batch)} record(s) to the database.")
+        for _, future in batch:
+            future.set_result(None)
+
+    def flush(self):
+        """
+        Blocks until every record queued so far has been written.
+        """
+        if self._writer is None:
+            return
+        marker = Future()
+        self._queue.put((None, marker))
+        marker.result()
+
+
+def _meeting_from_row(row):
+    meeting_id, filename, transcription, summary, key_points, segments, upload_time = row
+    if hasattr(upload_time, "isoformat"):
+        upload_time = upload_time.isoformat()
+    return {
+        "id": meeting_id,
+        "filename": filename,
+        "transcription": transcription,
+        "summary": summary,
+        "key_points": key_points.split("; ") if key_points else [],
+        "segments": json.loads(segments) if segments else [],
+        "upload_time": upload_time,
+    }
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """
+    Returns the process-wide Database, creating its backend on first use.
+    """
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database()
+    return _database
@@ -0,0 +1,118 @@
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_STOP = object()
+
+
+class Stage:
+    """
+    One step of a StagedPipeline.
+
+    kind is "thread" to run func on the stage's own worker threads, or "process"
+    to run it in a process pool (func and its argument must then be picklable).
+    A stage with kind "thread" and a single worker is how a model-owning step
+    such as Whisper is expressed: exactly one thread ever calls into the model.
+    queue_size bounds the number of items waiting in front of the stage; 0 means
+    unbounded.
+    """
+
+    def __init__(self, name, func, workers=1, kind="thread", queue_size=4):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown stage kind '{kind}'")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.kind = kind
+        self.queue_size = queue_size
+
+
+class StagedPipeline:
+    """
+    Runs items through a sequence of stages, each with its own workers and a
+    bounded input queue, so different items can occupy different stages at the
+    same time. When a downstream queue is full the upstream workers block, which
+    keeps memory bounded and lets throughput settle at the rate of the slowest
+    stage.
+
+    Callbacks:
+      on_start(item, stage_name)                called before a stage runs
+      on_done(item, stage_name, output) -> item called after it succeeds; the
+                                                returned item is passed on, or
+                                                None to drop it from the pipeline
+      on_error(item, stage_name, exception)     called if the stage raises
+      on_complete(item)                         called after the last stage
+    """
+
+    def __init__(self, stages, on_start=None, on_done=None, on_error=None, on_complete=None):
+        self.stages = stages
+        self._index = {stage.name: i for i, stage in enumerate(stages)}
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self._pools = {}
+        self._threads = []
+        self.on_start = on_start or (lambda item, stage_name: None)
+        self.on_done = on_done or (lambda item, stage_name, output: item)
+        self.on_error = on_error or (lambda item, stage_name, exc: None)
+        self.on_complete = on_complete or (lambda item: None)
+
+    def start(self):
+        if self._threads:
+            return
+        for index, stage in enumerate(self.stages):
+            if stage.kind == "process":
+                self._pools[stage.name] = ProcessPoolExecutor(max_workers=stage.workers)
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(index,), name=f"stage-{stage.name}-{n}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item, stage_name=None):
+        """
+        Queues item at the given stage (the first stage by default). Blocks while
+        that stage's queue is full.
+        """
+        index = self._index[stage_name] if stage_name else 0
+        self._queues[index].put(item)
+
+    def _run(self, stage, item):
+        if stage.kind == "process":
+            return self._pools[stage.name].submit(stage.func, item).result()
+        return stage.func(item)
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                break
+            try:
+                self.on_start(item, stage.name)
+                output = self._run(stage, item)
+                item = self.on_done(item, stage.name, output)
+            except Exception as e:
+                self.on_error(item, stage.name, e)
+                continue
+            if item is None:
+                continue
+            if index + 1 < len(self.stages):
+                self._queues[index + 1].put(item)
+            else:
+                self.on_complete(item)
+
+    def shutdown(self):
+        """
+        Stops the workers once the items already queued in front of each stage
+        have been handed on.
+        """
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                self._queues[index].put(_STOP)
+            for thread in self._threads:
+                if thread.name.startswith(f"stage-{stage.name}-"):
+                    thread.join()
+        for pool in self._pools.values():
+            pool.shutdown()
+        self._threads = []
@@ -0,0 +1,62 @@
+import os
+import threading
+
+# Requests one server process works on at once, and how many more may wait for
+# a slot. Anything beyond that is turned away with 429 and a Retry-After, so
+# clients back off instead of queueing behind work they would time out on.
+MAX_ACTIVE_REQUESTS = int(os.environ.get("MAX_ACTIVE_REQUESTS", "4"))
+MAX_QUEUED_REQUESTS = int(os.environ.get("MAX_QUEUED_REQUESTS", "8"))
+# Longest a queued request waits for a slot before it is turned away.
+REQUEST_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_QUEUE_TIMEOUT_SECONDS", "30"))
+RETRY_AFTER_SECONDS = 2
+
+
+class RequestLimiter:
+    """
+    Admission control for one process: up to max_active requests run, up to
+    max_queued more wait at most timeout seconds for a slot, and acquire()
+    returns False for the rest. Every successful acquire() must be paired with
+    a release().
+    """
+
+    def __init__(self, max_active=MAX_ACTIVE_REQUESTS, max_queued=MAX_QUEUED_REQUESTS,
+                 timeout=REQUEST_QUEUE_TIMEOUT_SECONDS):
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.queued = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(max_active)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                return False
+            self.queued += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self.queued -= 1
+                if not acquired:
+                    self.rejected += 1
+        return acquired
+
+    def release(self):
+        self._slots.release()
+
+    def render(self):
+        """
+        Returns the queue length and rejection count in Prometheus text format.
+        """
+        return "\n".join([
+            "# HELP meeting_requests_queued Requests waiting for a slot in this process.",
+            "# TYPE meeting_requests_queued gauge",
+            f"meeting_requests_queued {self.queued}",
+            "# HELP meeting_requests_rejected_total Requests turned away with 429.",
+            "# TYPE meeting_requests_rejected_total counter",
+            f"meeting_requests_rejected_total {self.rejected}",
+        ]) + "\n"
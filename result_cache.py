@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+import soundfile as sf
+
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "./app/cache")
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Result fields that point at files which are copied into the cache.
+CACHED_FILE_FIELDS = ("processed_audio", "audio_summary_file")
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def save_upload(stream, folder, filename):
+    """
+    Streams an uploaded file to disk while hashing it. The file is stored under
+    a name prefixed with its content hash so uploads that share a filename no
+    longer overwrite each other. Returns (file_path, sha256 hex digest).
+    """
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                data = stream.read(HASH_BLOCK_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+                out.write(data)
+        content_hash = digest.hexdigest()
+        file_path = os.path.join(folder, f"{content_hash[:16]}_{filename}")
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return file_path, content_hash
+
+
+def hash_pcm(file_path):
+    """
+    Hashes the decoded 16-bit PCM of an audio file, so the same recording in a
+    different container or with different metadata maps to the same key.
+    """
+    digest = hashlib.sha256()
+    try:
+        info = sf.info(file_path)
+        digest.update(f"{info.samplerate}:{info.channels}:".encode())
+        for block in sf.blocks(file_path, blocksize=HASH_BLOCK_SIZE, dtype='int16', always_2d=True):
+            digest.update(block.tobytes())
+    except RuntimeError:
+        import librosa
+        y, sr = librosa.load(file_path, sr=None, mono=False)
+        digest.update(f"{sr}:{y.ndim}:".encode())
+        digest.update((y * 32767).astype('int16').tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent, size-bounded LRU cache of pipeline results keyed by content hash.
+
+    Each entry stores the transcription, summary and key points along with copies
+    of the processed audio and TTS files. Additional hashes (e.g. the raw-bytes
+    hash of an upload) can be registered as aliases of an entry. Like JobStore,
+    it opens one connection per process, so forked server workers can share it.
+
+    Results also depend on how the pipeline is configured, so every hash is
+    combined with config: entries made under another configuration are never
+    returned and age out of the cache like any unused entry.
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES, config=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.config = config
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    result TEXT,
+                    size INTEGER,
+                    last_access REAL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS aliases (
+                    alias TEXT PRIMARY KEY,
+                    key TEXT
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+    @property
+    def _conn(self):
+        # A sqlite connection must not be used across fork().
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(
+                os.path.join(self.cache_dir, "index.db"), check_same_thread=False, timeout=30
+            )
+            self._pid = os.getpid()
+        return self._connection
+
+    def _key(self, content_hash):
+        if not self.config:
+            return content_hash
+        return hashlib.sha256(f"{self.config}:{content_hash}".encode()).hexdigest()
+
+    def get(self, content_hash):
+        """
+        Returns the cached result for content_hash (or an alias of it), or None.
+        """
+        content_hash = self._key(content_hash)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT e.key, e.result FROM entries e LEFT JOIN aliases a ON a.key = e.key "
+                "WHERE e.key = ? OR a.alias = ? LIMIT 1",
+                (content_hash, content_hash),
+            ).fetchone()
+            if row is None:
+                return None
+            key, result = row
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        result = json.loads(result)
+        if any(result.get(field) and not os.path.exists(result[field]) for field in CACHED_FILE_FIELDS):
+            self._remove(key)
+            return None
+        return result
+
+    def put(self, content_hash, result, aliases=()):
+        """
+        Stores result under content_hash, copying its files into the cache, and
+        evicts least recently used entries until the cache fits in max_bytes.
+        Returns the stored result with file paths pointing into the cache.
+        """
+        content_hash = self._key(content_hash)
+        aliases = [self._key(alias) for alias in aliases]
+        entry_dir = os.path.join(self.cache_dir, content_hash)
+        os.makedirs(entry_dir, exist_ok=True)
+        stored = dict(result)
+        size = 0
+        for field in CACHED_FILE_FIELDS:
+            source = result.get(field)
+            if not source or not os.path.exists(source):
+                continue
+            target = os.path.join(entry_dir, field + os.path.splitext(source)[1])
+            shutil.copyfile(source, target)
+            size += os.path.getsize(target)
+            stored[field] = target
+        encoded = json.dumps(stored)
+        size += len(encoded)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, result, size, last_access) VALUES (?, ?, ?, ?)",
+                (content_hash, encoded, size, time.time()),
+            )
+            for alias in aliases:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO aliases (alias, key) VALUES (?, ?)", (alias, content_hash)
+                )
+        self._evict()
+        return stored
+
+    def add_alias(self, alias, content_hash):
+        alias, content_hash = self._key(alias), self._key(content_hash)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO aliases (alias, key) VALUES (?, ?)", (alias, content_hash)
+            )
+
+    def _remove(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM aliases WHERE key = ?", (key,))
+        shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+
+    def _evict(self):
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
@@ -0,0 +1,128 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+import vad
+
+# Number of processes a long recording is transcribed with. 1 disables sharding.
+# Meant for CPU servers; on a GPU a single process is already saturating it.
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", "1"))
+# Recordings shorter than two shards of this length are transcribed in one piece.
+SHARD_MIN_SECONDS = float(os.environ.get("TRANSCRIBE_SHARD_MIN_SECONDS", "120"))
+# Each cut is placed at the quietest frame within this distance of the even split.
+SHARD_SEARCH_SECONDS = 5
+# Audio each shard also decodes past its cuts, so words at a cut are heard whole.
+SHARD_OVERLAP_SECONDS = 1
+
+# Model inherited from the parent process when workers are forked, so every
+# worker shares the same read-only weights instead of loading its own copy.
+_shared_model = None
+
+
+def _init_worker(model_name, threads):
+    import torch
+    from inference import load_whisper
+    global _shared_model
+    torch.set_num_threads(threads)
+    if _shared_model is None:
+        # Spawned (not forked) workers start empty and load their own copy.
+        _shared_model = load_whisper(model_name)
+
+
+def _transcribe_shard(file_path, start, stop):
+    """
+    Transcribes samples [start, stop) of file_path and returns its segments with
+    timestamps relative to the whole file. Runs in a worker process.
+    """
+    audio, sr = sf.read(file_path, start=start, stop=stop, dtype='float32')
+    result = _shared_model.transcribe(audio, fp16=False, condition_on_previous_text=False)
+    offset = start / sr
+    return [
+        {"start": offset + segment["start"], "end": offset + segment["end"], "text": segment["text"]}
+        for segment in result["segments"]
+    ]
+
+
+def shard_boundaries(file_path, shards):
+    """
+    Returns shards + 1 sample positions splitting file_path into roughly equal
+    parts, with every inner cut moved to the quietest nearby frame so that no
+    cut lands in the middle of a word.
+    """
+    info = sf.info(file_path)
+    total, sr = info.frames, info.samplerate
+    search = int(SHARD_SEARCH_SECONDS * sr)
+    frame = int(vad.FRAME_SECONDS * sr)
+    cuts = [0]
+    for index in range(1, shards):
+        target = total * index // shards
+        window_start = max(cuts[-1] + 1, target - search)
+        window, _ = sf.read(file_path, start=window_start, stop=min(total, target + search), dtype='float32')
+        rms = vad.frame_rms(window, sr)
+        cut = window_start + int(np.argmin(rms)) * frame + frame // 2 if len(rms) else target
+        cuts.append(min(cut, total))
+    cuts.append(total)
+    return cuts
+
+
+def _stitch(shard_segments, cuts):
+    """
+    Merges per-shard segments into one timeline. Shards overlap, so a segment is
+    kept only by the shard whose cuts contain its midpoint; an identical segment
+    repeated across a cut is dropped.
+    """
+    merged = []
+    for index, segments in enumerate(shard_segments):
+        owned_start, owned_end = cuts[index], cuts[index + 1]
+        for segment in segments:
+            middle = (segment["start"] + segment["end"]) / 2
+            if not owned_start <= middle < owned_end:
+                continue
+            if merged and merged[-1]["text"].strip() == segment["text"].strip() \
+                    and segment["start"] < merged[-1]["end"]:
+                continue
+            merged.append(segment)
+    return merged
+
+
+def transcribe_sharded(file_path, model, model_name, workers=TRANSCRIBE_WORKERS):
+    """
+    Transcribes file_path (16 kHz mono, e.g. from process_audio) in parallel and
+    returns a Whisper-style {"text", "segments"} result, or None if the file is
+    too short to be worth sharding.
+
+    The file is cut at silences into one shard per worker, and the shards are
+    transcribed by a pool of forked processes that share model with the caller.
+    The caller must hold model for the duration of the call.
+    """
+    info = sf.info(file_path)
+    duration = info.frames / info.samplerate
+    shards = min(workers, int(duration // SHARD_MIN_SECONDS))
+    if shards < 2:
+        return None
+    cuts = shard_boundaries(file_path, shards)
+    overlap = int(SHARD_OVERLAP_SECONDS * info.samplerate)
+    cut_seconds = [cut / info.samplerate for cut in cuts]
+    # Each worker gets an even share of the cores for torch's own threads.
+    threads = max(1, (os.cpu_count() or 1) // shards)
+
+    global _shared_model
+    _shared_model = model
+    try:
+        # Forked workers see _shared_model without pickling or reloading it.
+        context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+        with ProcessPoolExecutor(max_workers=shards, mp_context=context,
+                                 initializer=_init_worker, initargs=(model_name, threads)) as pool:
+            futures = [
+                pool.submit(_transcribe_shard, file_path,
+                            max(0, cuts[i] - overlap), min(info.frames, cuts[i + 1] + overlap))
+                for i in range(shards)
+            ]
+            shard_segments = [future.result() for future in futures]
+    finally:
+        _shared_model = None
+    segments = _stitch(shard_segments, cut_seconds)
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import soundfile as sf
+
+import vad
+from model_registry import registry
+from metrics import stage_metrics
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where only the single-process development server runs.
+    fcntl = None
+
+STREAM_SAMPLE_RATE = 16000
+# A pause at least this long ends a segment.
+STREAM_MIN_SILENCE_SECONDS = 0.5
+# Segments are cut at the quietest point once the window reaches this length,
+# keeping every Whisper call inside a single 30 s context.
+STREAM_MAX_WINDOW_SECONDS = 25
+# How much new audio must arrive before the open segment is decoded again.
+STREAM_PARTIAL_INTERVAL_SECONDS = 2
+STREAM_SESSION_TIMEOUT_SECONDS = int(os.environ.get("STREAM_SESSION_TIMEOUT_SECONDS", "600"))
+# Characters of finalized text passed to Whisper as context for the next segment.
+STREAM_PROMPT_CHARS = 200
+
+
+class StreamingSession:
+    """
+    Incrementally transcribes 16 kHz mono PCM as it arrives.
+
+    Audio accumulates in a sliding window. When the VAD sees a long enough pause
+    after speech (or the window gets too long), everything up to the middle of
+    the pause is transcribed once as a finalized segment and dropped from the
+    window. In between, the open part of the window is re-decoded every few
+    seconds to produce a partial result. The raw audio is also written to a WAV
+    file so the recording can be summarized and stored once it ends.
+
+    The session's state is saved next to the WAV file after every request, so
+    consecutive requests may be served by different server processes: a
+    process that finds a newer state on disk reloads it (and the window from
+    the WAV file) before continuing. With resume=True an existing session is
+    opened instead of a new one being created.
+    """
+
+    def __init__(self, session_id, output_path, resume=False):
+        self.id = session_id
+        self.output_path = output_path
+        self.state_path = os.path.splitext(output_path)[0] + ".json"
+        self.segments = []
+        self.partial = None
+        self.closed = False
+        self.last_activity = time.time()
+        self._buffer = np.zeros(0, dtype=np.float32)
+        # Samples of the recording before the start of the window.
+        self._offset = 0
+        self._decoded_samples = 0
+        self._noise_floor = vad.NoiseFloorTracker(initial=vad.INITIAL_NOISE_FLOOR)
+        self._version = 0
+        self._lock = threading.Lock()
+        if not resume:
+            sf.SoundFile(output_path, 'w', samplerate=STREAM_SAMPLE_RATE, channels=1, subtype='PCM_16').close()
+            self._save()
+
+    def _save(self):
+        self._version += 1
+        state = {
+            "version": self._version,
+            "segments": self.segments,
+            "partial": self.partial,
+            "closed": self.closed,
+            "last_activity": self.last_activity,
+            "offset": int(self._offset),
+            "decoded_samples": int(self._decoded_samples),
+            "noise_floor": self._noise_floor.floor,
+        }
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _load(self):
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state["version"] == self._version:
+            return
+        self._version = state["version"]
+        self.segments = state["segments"]
+        self.partial = state["partial"]
+        self.closed = state["closed"]
+        self.last_activity = state["last_activity"]
+        self._offset = state["offset"]
+        self._decoded_samples = state["decoded_samples"]
+        self._noise_floor.floor = state["noise_floor"]
+        # The window is always the tail of the recording from the offset on.
+        with sf.SoundFile(self.output_path) as wav:
+            wav.seek(self._offset)
+            self._buffer = wav.read(dtype='float32')
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the session for one request against other threads and, where
+        fcntl is available, other server processes, with its state loaded
+        before and saved after.
+        """
+        with self._lock, open(self.output_path, 'rb') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            self._load()
+            try:
+                yield
+            finally:
+                self._save()
+
+    @property
+    def text(self):
+        return " ".join(segment["text"] for segment in self.segments).strip()
+
+    def add_audio(self, pcm_bytes):
+        """
+        Appends int16 PCM and returns (newly finalized segments, current partial).
+        """
+        samples = np.frombuffer(pcm_bytes, dtype=np.int16)
+        with self._locked():
+            if self.closed:
+                raise RuntimeError("Streaming session is already finished")
+            self.last_activity = time.time()
+            with sf.SoundFile(self.output_path, 'r+') as wav:
+                wav.seek(0, sf.SEEK_END)
+                wav.write(samples)
+            audio = samples.astype(np.float32) / 32768.0
+            self._noise_floor.update(audio, STREAM_SAMPLE_RATE)
+            self._buffer = np.concatenate((self._buffer, audio))
+            finalized = self._advance(final=False)
+            return finalized, self.partial
+
+    def finish(self, idle_timeout=None):
+        """
+        Finalizes whatever is left in the window and closes the session.
+        Returns the finalized segments, or None if the session was already
+        finished (possibly by another server process) or, with idle_timeout,
+        has received audio within the last idle_timeout seconds.
+        """
+        with self._locked():
+            if self.closed:
+                return None
+            if idle_timeout is not None and time.time() - self.last_activity <= idle_timeout:
+                return None
+            finalized = self._advance(final=True)
+            self.closed = True
+            return finalized
+
+    def _speech_mask(self):
+        return vad.speech_mask(self._buffer, STREAM_SAMPLE_RATE, noise_floor=self._noise_floor.floor)
+
+    def _advance(self, final):
+        finalized = []
+        while True:
+            self._drop_leading_silence()
+            cut = self._find_cut(final)
+            if cut is None:
+                break
+            segments = self._transcribe(self._buffer[:cut])
+            finalized.extend(segments)
+            self.segments.extend(segments)
+            self._buffer = self._buffer[cut:]
+            self._offset += cut
+            self._decoded_samples = 0
+            self.partial = None
+        if final:
+            return finalized
+        if len(self._buffer) - self._decoded_samples >= STREAM_PARTIAL_INTERVAL_SECONDS * STREAM_SAMPLE_RATE:
+            segments = self._transcribe(self._buffer)
+            self._decoded_samples = len(self._buffer)
+            if segments:
+                self.partial = {
+                    "start": segments[0]["start"],
+                    "end": segments[-1]["end"],
+                    "text": " ".join(segment["text"] for segment in segments),
+                    "final": False,
+                }
+        return finalized
+
+    def _drop_leading_silence(self):
+        # Whisper tends to hallucinate on pure silence, so leading non-speech is
+        # skipped (keeping a short lead-in) instead of being transcribed.
+        mask = self._speech_mask()
+        if len(mask) == 0:
+            return
+        frame = int(vad.FRAME_SECONDS * STREAM_SAMPLE_RATE)
+        speech = np.flatnonzero(mask)
+        first_speech = int(speech[0]) * frame if len(speech) else len(self._buffer)
+        drop = first_speech - int(STREAM_MIN_SILENCE_SECONDS * STREAM_SAMPLE_RATE)
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._offset += drop
+            self._decoded_samples = max(0, self._decoded_samples - drop)
+
+    def _find_cut(self, final):
+        """
+        Returns the sample index at which to finalize the window, or None.
+        """
+        if len(self._buffer) == 0:
+            return None
+        mask = self._speech_mask()
+        if not mask.any():
+            return None
+        if final:
+            return len(self._buffer)
+        frame = int(vad.FRAME_SECONDS * STREAM_SAMPLE_RATE)
+        min_silence = int(STREAM_MIN_SILENCE_SECONDS / vad.FRAME_SECONDS)
+        first_speech = int(np.argmax(mask))
+        pauses = [(start, end) for start, end in vad.runs(mask, False)
+                  if start > first_speech and end - start >= min_silence]
+        if pauses:
+            start, end = pauses[-1]
+            return (start + end) // 2 * frame
+        if len(self._buffer) >= STREAM_MAX_WINDOW_SECONDS * STREAM_SAMPLE_RATE:
+            rms = vad.frame_rms(self._buffer, STREAM_SAMPLE_RATE)
+            half = len(rms) // 2
+            return (half + int(np.argmin(rms[half:]))) * frame
+        return None
+
+    def _transcribe(self, audio):
+        prompt = self.text[-STREAM_PROMPT_CHARS:] or None
+        with registry.use("whisper") as model, stage_metrics.measure("whisper", len(audio) / STREAM_SAMPLE_RATE):
+            result = model.transcribe(audio, fp16=False, initial_prompt=prompt, condition_on_previous_text=False)
+        offset = self._offset / STREAM_SAMPLE_RATE
+        return [
+            {
+                "start": round(offset + segment["start"], 2),
+                "end": round(offset + segment["end"], 2),
+                "text": segment["text"].strip(),
+                "final": True,
+            }
+            for segment in result["segments"]
+            if segment["text"].strip()
+        ]
+
+
+class StreamingSessions:
+    """
+    Thread-safe registry of open streaming sessions. Sessions that receive no
+    audio for STREAM_SESSION_TIMEOUT_SECONDS are closed and forgotten. Sessions
+    started by another server process are opened from disk on first use.
+    """
+
+    def __init__(self, output_folder, timeout=STREAM_SESSION_TIMEOUT_SECONDS):
+        self.output_folder = output_folder
+        self.timeout = timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self):
+        self.expire_idle()
+        session_id = uuid.uuid4().hex
+        session = StreamingSession(session_id, self._output_path(session_id))
+        with self._lock:
+            self._sessions[session_id] = session
+        return session
+
+    def _output_path(self, session_id):
+        return os.path.join(self.output_folder, f"stream_{session_id}.wav")
+
+    def _open(self, session_id):
+        # Caller must hold the lock.
+        session = self._sessions.get(session_id)
+        if session is None and session_id.isalnum() and os.path.exists(self._output_path(session_id)):
+            session = StreamingSession(session_id, self._output_path(session_id), resume=True)
+            self._sessions[session_id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._open(session_id)
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._open(session_id)
+            self._sessions.pop(session_id, None)
+            return session
+
+    def expire_idle(self):
+        now = time.time()
+        with self._lock:
+            expired = [s for s in self._sessions.values() if now - s.last_activity > self.timeout]
+            for session in expired:
+                del self._sessions[session.id]
+        for session in expired:
+            # Another server process may have received audio for it meanwhile.
+            session.finish(idle_timeout=self.timeout)
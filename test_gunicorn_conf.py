@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import runpy
+import socket
+import subprocess
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# A stand-in for app.py with the same admission control, so the server can
+# run without loading any models.
+LIMITED_APP = '''
+import time
+from flask import Flask, g, jsonify, request
+from request_limiter import RequestLimiter
+
+app = Flask(__name__)
+limiter = RequestLimiter()
+
+@app.before_request
+def limit_concurrency():
+    if request.path == "/healthz":
+        return None
+    if not limiter.acquire():
+        return jsonify({"error": "busy"}), 429, {"Retry-After": "2"}
+    g.holds_request_slot = True
+
+@app.teardown_request
+def release(exc):
+    if g.pop("holds_request_slot", False):
+        limiter.release()
+
+@app.route("/healthz")
+def healthz():
+    return "ok"
+
+@app.route("/slow")
+def slow():
+    time.sleep(2)
+    return "done"
+'''
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_requests_beyond_the_limiter_get_429_under_gunicorn(tmp_path, monkeypatch):
+    limits = {"MAX_ACTIVE_REQUESTS": "1", "MAX_QUEUED_REQUESTS": "1", "REQUEST_QUEUE_TIMEOUT_SECONDS": "10"}
+    for name, value in limits.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv("REJECT_THREADS", "2")
+    monkeypatch.syspath_prepend(REPO)
+    sys.modules.pop("request_limiter", None)
+    config = runpy.run_path(os.path.join(REPO, "gunicorn.conf.py"))
+    sys.modules.pop("request_limiter", None)
+
+    port = _free_port()
+    (tmp_path / "limited_app.py").write_text(LIMITED_APP)
+    (tmp_path / "test.conf.py").write_text(
+        f"bind = '127.0.0.1:{port}'\nworkers = 1\nworker_class = {config['worker_class']!r}\n"
+        f"threads = {config['threads']}\nworker_connections = {config['worker_connections']}\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), REPO]))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "test.conf.py", "limited_app:app"],
+        cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 20
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1)
+                break
+            except OSError:
+                assert time.time() < deadline, "gunicorn did not start"
+                time.sleep(0.2)
+
+        # Several times more concurrent requests than the worker has threads:
+        # one runs, one queues, and every other one is turned away quickly.
+        requests = config["threads"] * 3
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=requests) as pool:
+            statuses = list(pool.map(lambda _: _get(f"http://127.0.0.1:{port}/slow"), range(requests)))
+        assert statuses.count(200) == 2
+        assert statuses.count(429) == requests - 2
+        assert time.time() - started < 10
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
@@ -0,0 +1,52 @@
+import numpy as np
+
+import streaming
+
+SR = streaming.STREAM_SAMPLE_RATE
+
+
+def _voice(seconds, f0=140.0):
+    t = np.arange(int(seconds * SR)) / SR
+    harmonics = sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, 20))
+    # A sustained vowel: every frame of the first chunk is equally loud, so
+    # none of it looks like background noise.
+    return 0.05 * harmonics
+
+
+def _silence(seconds, seed=0):
+    return 0.001 * np.random.default_rng(seed).standard_normal(int(seconds * SR))
+
+
+def _pcm(audio):
+    return (np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def _stream(tmp_path, monkeypatch, recording):
+    transcribed = []
+
+    def fake_transcribe(self, audio):
+        start = self._offset / SR
+        transcribed.append((start, start + len(audio) / SR))
+        return [{"start": round(start, 2), "end": round(start + len(audio) / SR, 2), "text": "words", "final": True}]
+
+    monkeypatch.setattr(streaming.StreamingSession, "_transcribe", fake_transcribe)
+    session = streaming.StreamingSession("test", str(tmp_path / "test.wav"))
+    for start in range(0, len(recording), SR):
+        session.add_audio(_pcm(recording[start:start + SR]))
+    session.finish()
+    return session, transcribed
+
+
+def test_speech_at_the_start_of_a_stream_is_transcribed(tmp_path, monkeypatch):
+    recording = np.concatenate([_voice(3.0), _silence(2.0), _voice(2.0)])
+    session, transcribed = _stream(tmp_path, monkeypatch, recording)
+
+    assert transcribed[0][0] == 0.0
+    assert session.segments[0]["start"] == 0.0
+
+
+def test_leading_silence_is_skipped(tmp_path, monkeypatch):
+    recording = np.concatenate([_silence(3.0), _voice(2.0)])
+    session, transcribed = _stream(tmp_path, monkeypatch, recording)
+
+    assert 2.0 <= transcribed[0][0] <= 3.0
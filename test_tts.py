@@ -0,0 +1,20 @@
+import subprocess
+
+import tts
+
+
+def test_local_backend_never_passes_text_as_argument(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(tts.shutil, "which", lambda name: "/usr/bin/espeak-ng")
+    monkeypatch.setattr(subprocess, "run", lambda args, **kwargs: calls.append((args, kwargs)))
+    backend = tts.LocalTTSBackend()
+    output_path = str(tmp_path / "out.wav")
+    sentences = ["-f/etc/passwd", "-w/tmp/elsewhere.wav", "--", "Hello there."]
+
+    for sentence in sentences:
+        backend.synthesize(sentence, output_path)
+
+    assert len(calls) == len(sentences)
+    for (args, kwargs), sentence in zip(calls, sentences):
+        assert args == ["/usr/bin/espeak-ng", "-v", tts.TTS_LANGUAGE, "-w", output_path, "--stdin"]
+        assert kwargs["input"] == sentence.encode()
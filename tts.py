@@ -0,0 +1,190 @@
+import os
+import re
+import uuid
+import shutil
+import struct
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import soundfile as sf
+
+# "local" (offline espeak-ng), "gtts" (Google, needs network) or "auto", which
+# picks the local engine when it is installed.
+TTS_BACKEND = os.environ.get("TTS_BACKEND", "auto")
+TTS_LANGUAGE = os.environ.get("TTS_LANGUAGE", "en")
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "4"))
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "./app/tts_cache")
+TTS_OUTPUT_DIR = os.environ.get("TTS_OUTPUT_DIR", "./app/tts")
+
+
+def split_sentences(text):
+    return [s for s in re.split(r'(?<=[.!?])\s+', text.strip()) if s.strip()]
+
+
+def normalize_sentence(sentence):
+    return " ".join(sentence.split()).lower()
+
+
+class LocalTTSBackend:
+    """
+    Offline synthesis with the espeak-ng (or espeak) command line tool. Each
+    call is a separate process, so sentences can be synthesized in parallel.
+    """
+    name = "local"
+    extension = ".wav"
+
+    def __init__(self, language=TTS_LANGUAGE):
+        self.language = language
+        self.executable = shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.executable is None:
+            raise RuntimeError("espeak-ng is not installed")
+
+    def synthesize(self, sentence, output_path):
+        # The text goes through stdin, never argv: espeak parses every argument
+        # starting with "-" as an option, so text like "-f/etc/passwd" would be
+        # read as one.
+        subprocess.run(
+            [self.executable, "-v", self.language, "-w", output_path, "--stdin"],
+            input=sentence.encode(), check=True, capture_output=True,
+        )
+
+
+class GTTSBackend:
+    """
+    Google Translate TTS. Needs network access.
+    """
+    name = "gtts"
+    extension = ".mp3"
+
+    def __init__(self, language=TTS_LANGUAGE):
+        self.language = language
+
+    def synthesize(self, sentence, output_path):
+        from gtts import gTTS
+        gTTS(text=sentence, lang=self.language).save(output_path)
+
+
+def create_backend(name=TTS_BACKEND):
+    if name == "auto":
+        name = "local" if (shutil.which("espeak-ng") or shutil.which("espeak")) else "gtts"
+    if name == "local":
+        return LocalTTSBackend()
+    if name == "gtts":
+        return GTTSBackend()
+    raise ValueError(f"Unknown TTS backend '{name}'")
+
+
+class SpeechSynthesizer:
+    """
+    Sentence-level text-to-speech with a persistent per-sentence cache.
+
+    Text is split into sentences, and each sentence is cached under a hash of
+    its normalized text, so repeated key points are synthesized only once.
+    Missing sentences are synthesized in parallel and joined into a single
+    output file per request.
+    """
+
+    def __init__(self, backend=None, cache_dir=TTS_CACHE_DIR, output_dir=TTS_OUTPUT_DIR, workers=TTS_WORKERS):
+        self.backend = backend or create_backend()
+        self.cache_dir = cache_dir
+        self.output_dir = output_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+
+    def _cache_path(self, sentence):
+        key = f"{self.backend.name}:{self.backend.language}:{normalize_sentence(sentence)}"
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + self.backend.extension)
+
+    def _synthesize_cached(self, sentence):
+        path = self._cache_path(sentence)
+        if not os.path.exists(path):
+            # Write to a unique temporary name so concurrent requests for the
+            # same sentence never see a half-written file.
+            tmp_path = f"{path}.{uuid.uuid4().hex}{self.backend.extension}"
+            self.backend.synthesize(sentence, tmp_path)
+            os.replace(tmp_path, path)
+        return path
+
+    def iter_sentence_audio(self, text):
+        """
+        Yields the cached audio file of each sentence in order. All sentences
+        are submitted at once, so later ones are synthesized while earlier ones
+        are being consumed; the first is available as soon as it is done.
+        """
+        futures = [self._pool.submit(self._synthesize_cached, s) for s in split_sentences(text)]
+        for future in futures:
+            yield future.result()
+
+    def synthesize(self, text, output_file=None):
+        """
+        Synthesizes text into output_file (a new file in output_dir by default).
+        The extension is adjusted to the backend's format. Returns the path.
+        """
+        if output_file is None:
+            output_file = os.path.join(self.output_dir, uuid.uuid4().hex + self.backend.extension)
+        else:
+            output_file = os.path.splitext(output_file)[0] + self.backend.extension
+        parts = list(self.iter_sentence_audio(text))
+        if self.backend.extension == ".mp3":
+            # MP3 frames are self-contained, so files can simply be appended.
+            with open(output_file, "wb") as out:
+                for part in parts:
+                    with open(part, "rb") as f:
+                        shutil.copyfileobj(f, out)
+        else:
+            samplerate = sf.info(parts[0]).samplerate if parts else 22050
+            with sf.SoundFile(output_file, "w", samplerate=samplerate, channels=1, subtype="PCM_16") as out:
+                for part in parts:
+                    out.write(sf.read(part, dtype="int16")[0])
+        return output_file
+
+    @property
+    def mimetype(self):
+        return "audio/mpeg" if self.backend.extension == ".mp3" else "audio/wav"
+
+    def stream(self, text):
+        """
+        Yields the audio of text as bytes, sentence by sentence, so playback can
+        start after the first sentence. WAV output gets a header with an open
+        ended length followed by raw PCM.
+        """
+        header_sent = False
+        for part in self.iter_sentence_audio(text):
+            if self.backend.extension == ".mp3":
+                with open(part, "rb") as f:
+                    yield f.read()
+                continue
+            pcm, samplerate = sf.read(part, dtype="int16")
+            if not header_sent:
+                yield _streaming_wav_header(samplerate)
+                header_sent = True
+            yield pcm.tobytes()
+
+
+def _streaming_wav_header(samplerate, channels=1, sample_width=2):
+    unknown = 0xFFFFFFFF
+    byte_rate = samplerate * channels * sample_width
+    return (
+        b"RIFF" + struct.pack("<I", unknown) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, samplerate, byte_rate, channels * sample_width,
+                                sample_width * 8)
+        + b"data" + struct.pack("<I", unknown)
+    )
+
+
+_synthesizer = None
+_synthesizer_lock = threading.Lock()
+
+
+def get_synthesizer():
+    """
+    Returns the process-wide SpeechSynthesizer, creating it on first use.
+    """
+    global _synthesizer
+    with _synthesizer_lock:
+        if _synthesizer is None:
+            _synthesizer = SpeechSynthesizer()
+    return _synthesizer
@@ -0,0 +1,431 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where only the single-process development server runs.
+    fcntl = None
+
+from result_cache import HASH_BLOCK_SIZE
+
+UPLOAD_SESSION_DIR = os.environ.get("UPLOAD_SESSION_DIR", "./app/uploads")
+# Chunk size suggested to clients; any size is accepted.
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+# Unfinished uploads are kept this long after their last chunk so they can resume.
+UPLOAD_SESSION_TIMEOUT_SECONDS = int(os.environ.get("UPLOAD_SESSION_TIMEOUT_SECONDS", str(24 * 3600)))
+# Preprocessing that runs ahead of an upload gives up once no bytes have
+# arrived for this long; the job then preprocesses the finished file instead.
+UPLOAD_STALL_SECONDS = int(os.environ.get("UPLOAD_STALL_SECONDS", "120"))
+UPLOAD_PREPROCESS_WORKERS = int(os.environ.get("UPLOAD_PREPROCESS_WORKERS", "2"))
+# How often a reader checks for chunks received by another server process.
+UPLOAD_POLL_SECONDS = 0.5
+# Containers soundfile can decode front to back while the rest is still arriving.
+EARLY_PREPROCESS_EXTENSIONS = (".wav", ".flac", ".ogg")
+# Running early preprocessing touches its state file every UPLOAD_POLL_SECONDS;
+# one left untouched for this long died with its server process.
+EARLY_PREPROCESS_TIMEOUT_SECONDS = int(os.environ.get("EARLY_PREPROCESS_TIMEOUT_SECONDS", "10"))
+
+
+class UploadError(Exception):
+    """
+    A rejected upload request. status is the HTTP status to answer with, and
+    offset (if set) is where the client should continue.
+    """
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class ChunkedUpload:
+    """
+    One resumable upload. Chunks are appended to a .part file in order, each
+    one verified against its checksum before it counts as received. The
+    verified offset is recorded in a .json file next to it, so an upload
+    survives a restart and can be continued by any server process.
+    """
+
+    def __init__(self, upload_id, folder, filename, size):
+        self.id = upload_id
+        self.filename = filename
+        self.size = size
+        self.path = os.path.join(folder, f"{upload_id}.part")
+        self.meta_path = os.path.join(folder, f"{upload_id}.json")
+        self.preprocess_path = os.path.join(folder, f"{upload_id}.preprocess.json")
+        self.final_path = None
+        self.content_hash = None
+        self.offset = self._received() or 0
+        self.aborted = False
+        self.preprocessed = None
+        self._write_lock = threading.Lock()
+        self._changed = threading.Condition()
+
+    def _received(self):
+        """
+        Returns the verified offset recorded on disk, or None once the upload
+        has been finalized or aborted.
+        """
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f).get("offset", 0)
+        except FileNotFoundError:
+            return None
+
+    def _save(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"filename": self.filename, "size": self.size, "offset": self.offset}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _set_offset(self, offset):
+        with self._changed:
+            self.offset = offset
+            self._changed.notify_all()
+
+    def refresh(self):
+        """
+        Picks up chunks received by other server processes. Returns False if
+        the upload has been finalized or aborted meanwhile.
+        """
+        received = self._received()
+        if received is None:
+            return False
+        self._set_offset(received)
+        return True
+
+    def idle_seconds(self):
+        try:
+            return time.time() - os.path.getmtime(self.meta_path)
+        except FileNotFoundError:
+            return float("inf")
+
+    @contextmanager
+    def _exclusive(self):
+        """
+        Holds the upload against writers in this process and, where fcntl is
+        available, in other server processes, with the offset brought up to
+        date. Raises a 409 instead of waiting if the upload is busy.
+        """
+        if not self._write_lock.acquire(blocking=False):
+            raise UploadError("Another chunk is being written", 409, self.offset)
+        try:
+            handle = None
+            if fcntl is not None:
+                try:
+                    handle = open(self.path, "rb")
+                except FileNotFoundError:
+                    raise UploadError("Upload is already finalized", 409, self.offset)
+            try:
+                if handle is not None:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        raise UploadError("Another chunk is being written", 409, self.offset)
+                if not self.refresh():
+                    raise UploadError("Upload is already finalized", 409, self.offset)
+                yield
+            finally:
+                if handle is not None:
+                    handle.close()
+        finally:
+            self._write_lock.release()
+
+    def write_chunk(self, offset, stream, checksum=None):
+        """
+        Appends the body read from stream at offset. Rejects the chunk with a
+        409 if offset is not where the upload currently ends, and discards it
+        if its sha256 does not match checksum or the client disconnects.
+        """
+        with self._exclusive():
+            if offset != self.offset:
+                raise UploadError(f"Expected offset {self.offset}", 409, self.offset)
+            digest = hashlib.sha256()
+            written = 0
+            with open(self.path, "r+b") as out:
+                # Drops the unverified tail of a chunk interrupted by a crash.
+                out.truncate(offset)
+                out.seek(offset)
+                try:
+                    while True:
+                        data = stream.read(HASH_BLOCK_SIZE)
+                        if not data:
+                            break
+                        if self.size is not None and offset + written + len(data) > self.size:
+                            raise UploadError("Chunk extends past the declared size", 400, self.offset)
+                        digest.update(data)
+                        out.write(data)
+                        written += len(data)
+                    if checksum and digest.hexdigest() != checksum.lower():
+                        raise UploadError("Chunk checksum mismatch", 400, self.offset)
+                except BaseException:
+                    out.truncate(offset)
+                    raise
+            self._set_offset(offset + written)
+            self._save()
+            return self.offset
+
+    def wait_for(self, end, handle=None):
+        """
+        Blocks until the first end bytes have been received. handle is an open
+        file of the upload, used to tell whether an upload that another process
+        closed was finalized (moved) or aborted (deleted).
+        """
+        deadline = time.time() + UPLOAD_STALL_SECONDS
+        with self._changed:
+            while self.offset < end:
+                if self.aborted:
+                    raise RuntimeError("Upload was aborted")
+                if time.time() > deadline:
+                    raise RuntimeError("Upload stalled")
+                if self._changed.wait(timeout=UPLOAD_POLL_SECONDS):
+                    deadline = time.time() + UPLOAD_STALL_SECONDS
+                    continue
+                received = self._received()
+                if received is None:
+                    if handle is None or os.fstat(handle.fileno()).st_nlink == 0:
+                        raise RuntimeError("Upload was aborted")
+                    received = self.size
+                if received > self.offset:
+                    self.offset = received
+                    deadline = time.time() + UPLOAD_STALL_SECONDS
+
+    def abort(self):
+        with self._changed:
+            self.aborted = True
+            self._changed.notify_all()
+
+
+class EarlyPreprocess:
+    """
+    Preprocessing that started while an upload was arriving, possibly in
+    another server process. Its state file next to the upload records whether
+    it is still running, and its output or error once it has finished.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _write(self, state):
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def start(self, pool, preprocess, upload):
+        """
+        Records the preprocessing as running, so that a finalize in any process
+        sees it, and runs it on pool.
+        """
+        self._write({"status": "running"})
+        pool.submit(self._run, preprocess, upload)
+
+    def _run(self, preprocess, upload):
+        # Nothing is recorded if the upload was aborted meanwhile.
+        stopped = threading.Event()
+
+        def heartbeat():
+            while not stopped.wait(UPLOAD_POLL_SECONDS):
+                try:
+                    os.utime(self.path)
+                except FileNotFoundError:
+                    return
+
+        threading.Thread(target=heartbeat, name="upload-preprocess-heartbeat", daemon=True).start()
+        try:
+            state = {"status": "done", "output": preprocess(upload.path, lambda: _GrowingFile(upload))}
+        except Exception as e:
+            state = {"status": "failed", "error": str(e)}
+        finally:
+            stopped.set()
+        if os.path.exists(self.path):
+            self._write(state)
+
+    def result(self):
+        """
+        Waits for the preprocessing to finish and returns its output. Raises
+        RuntimeError if it failed or its server process died.
+        """
+        while True:
+            try:
+                with open(self.path) as f:
+                    state = json.load(f)
+                idle = time.time() - os.path.getmtime(self.path)
+            except FileNotFoundError:
+                raise RuntimeError("Early preprocessing state is missing")
+            if state["status"] == "done":
+                os.remove(self.path)
+                return state["output"]
+            if state["status"] == "failed":
+                os.remove(self.path)
+                raise RuntimeError(state["error"])
+            if idle > EARLY_PREPROCESS_TIMEOUT_SECONDS:
+                raise RuntimeError("Early preprocessing stopped responding")
+            time.sleep(UPLOAD_POLL_SECONDS)
+
+
+class _GrowingFile:
+    """
+    Read-only file object over an upload that is still arriving. Reads block
+    until the requested bytes have been received, and the end of the file is
+    the declared final size, so soundfile can decode the finished part of a
+    recording before the rest has been uploaded.
+    """
+
+    def __init__(self, upload):
+        self._upload = upload
+        with upload._changed:
+            # finalize() renames the file under the same lock.
+            self._file = open(upload.final_path or upload.path, "rb")
+        self._pos = 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self._pos = offset
+        elif whence == os.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self._upload.size + offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def read(self, size=-1):
+        end = self._upload.size if size < 0 else min(self._pos + size, self._upload.size)
+        if end <= self._pos:
+            return b""
+        self._upload.wait_for(end, self._file)
+        self._file.seek(self._pos)
+        data = self._file.read(end - self._pos)
+        self._pos += len(data)
+        return data
+
+
+class ChunkedUploads:
+    """
+    Thread-safe registry of resumable uploads.
+
+    Protocol: create() an upload with the file's name and size, write its
+    chunks in order with write_chunk(), then finalize() it, which moves the
+    file to upload_folder under its content hash like save_upload(). Uploads
+    are recorded on disk, so a client can resume after a server restart.
+
+    If preprocess(file_path, source) is given, uploads of a known size in a
+    streamable format are preprocessed while their chunks arrive, by whichever
+    server process created them. The outcome is kept in a state file next to
+    the upload, so after finalize() the upload's preprocessed attribute is an
+    EarlyPreprocess in every server process.
+    """
+
+    def __init__(self, upload_folder, session_folder=UPLOAD_SESSION_DIR, preprocess=None,
+                 timeout=UPLOAD_SESSION_TIMEOUT_SECONDS):
+        self.upload_folder = upload_folder
+        self.session_folder = session_folder
+        self.preprocess = preprocess
+        self.timeout = timeout
+        os.makedirs(session_folder, exist_ok=True)
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=UPLOAD_PREPROCESS_WORKERS, thread_name_prefix="upload-preprocess"
+        )
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.session_folder, f"{upload_id}.json")
+
+    def create(self, filename, size=None):
+        self.expire_idle()
+        upload_id = uuid.uuid4().hex
+        upload = ChunkedUpload(upload_id, self.session_folder, filename, size)
+        open(upload.path, "wb").close()
+        upload._save()
+        with self._lock:
+            self._uploads[upload_id] = upload
+        if self.preprocess is not None and size and filename.lower().endswith(EARLY_PREPROCESS_EXTENSIONS):
+            EarlyPreprocess(upload.preprocess_path).start(self._pool, self.preprocess, upload)
+        return upload
+
+    def get(self, upload_id):
+        """
+        Returns the upload with its offset up to date, or None if it is unknown
+        or has been finalized or aborted (possibly by another server process).
+        """
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None and upload_id.isalnum() and os.path.exists(self._meta_path(upload_id)):
+                # Started before a restart or in another server process.
+                with open(self._meta_path(upload_id)) as f:
+                    meta = json.load(f)
+                upload = ChunkedUpload(upload_id, self.session_folder, meta["filename"], meta["size"])
+                self._uploads[upload_id] = upload
+        if upload is not None and not upload.refresh():
+            with self._lock:
+                self._uploads.pop(upload_id, None)
+            return None
+        return upload
+
+    def finalize(self, upload_id, checksum=None):
+        """
+        Verifies the complete file, moves it into upload_folder and returns
+        the upload, whose final_path and content_hash are then set. Its
+        preprocessed attribute is the EarlyPreprocess of the upload, if any.
+        """
+        upload = self.get(upload_id)
+        if upload is None:
+            raise UploadError("Unknown upload", 404)
+        with upload._exclusive():
+            if upload.size is not None and upload.offset != upload.size:
+                raise UploadError("Upload is incomplete", 409, upload.offset)
+            digest = hashlib.sha256()
+            with open(upload.path, "rb") as f:
+                for data in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                    digest.update(data)
+            content_hash = digest.hexdigest()
+            if checksum and content_hash != checksum.lower():
+                raise UploadError("File checksum mismatch", 400, upload.offset)
+            file_path = os.path.join(self.upload_folder, f"{content_hash[:16]}_{upload.filename}")
+            with upload._changed:
+                os.replace(upload.path, file_path)
+                upload.final_path = file_path
+                upload.content_hash = content_hash
+            os.remove(upload.meta_path)
+        if os.path.exists(upload.preprocess_path):
+            upload.preprocessed = EarlyPreprocess(upload.preprocess_path)
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        return upload
+
+    def abort(self, upload_id):
+        """
+        Deletes an upload. Returns False if it is unknown, and raises a 409
+        UploadError while one of its chunks is being written.
+        """
+        upload = self.get(upload_id)
+        if upload is None:
+            return False
+        with upload._exclusive():
+            for path in (upload.path, upload.meta_path, upload.preprocess_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        upload.abort()
+        return True
+
+    def expire_idle(self):
+        with self._lock:
+            uploads = list(self._uploads.values())
+        for upload in uploads:
+            if upload.idle_seconds() > self.timeout:
+                try:
+                    self.abort(upload.id)
+                except UploadError:
+                    pass
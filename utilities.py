@@ -1,138 +1,419 @@
-import os
-import librosa
-import noisereduce as nr
-import mysql.connector
-import numpy as np
-from transformers import pipeline
-import torch
-import whisper
-import soundfile as sf  # Using soundfile to write WAV files
-from gtts import gTTS  # For TTS
-
-# Warn if CUDA is not available
-if not torch.cuda.is_available():
-    print("Warning: CUDA is not available. Running Whisper on CPU.")
-
-# Load the Whisper model (load once for efficiency)
-model = whisper.load_model("base")
-
-# MySQL configuration – update these values if needed
-DB_CONFIG = {
-    'host': 'localhost',      # Use your MySQL host
-    'port': 3307,             # Use your MySQL port
-    'user': 'root',
-    'password': 'password',
-    'database': 'Meeting_Assistant',
-}
-
-def process_audio(file_path):
-    """
-    Preprocesses audio by loading it, reducing noise, and resampling to 16kHz.
-    """
-    try:
-        y, sr = librosa.load(file_path, sr=None)
-        print(f"Original sample rate: {sr}, Audio duration: {len(y)/sr:.2f}s")
-        reduced_noise = nr.reduce_noise(y=y, sr=sr)
-        reduced_noise = np.nan_to_num(reduced_noise, nan=0.0, posinf=0.0, neginf=0.0)
-        target_sr = 16000
-        resampled_audio = librosa.resample(reduced_noise, orig_sr=sr, target_sr=target_sr)
-        output_path = os.path.splitext(file_path)[0] + "_processed.wav"
-        sf.write(output_path, resampled_audio, target_sr)
-        return output_path
-    except Exception as e:
-        raise RuntimeError(f"Error processing audio: {str(e)}")
-
-def transcribe_audio(file_path):
-    """
-    Transcribes audio using Whisper.
-    """
-    try:
-        result = model.transcribe(file_path)
-        transcription = result['text']
-        return transcription
-    except Exception as e:
-        raise RuntimeError(f"Error transcribing audio: {str(e)}")
-
-def summarize_text(text):
-    """
-    Summarizes text and extracts key points using Hugging Face transformers.
-    If text is less than 50 words, returns it as is.
-    If text is very long (>1024 characters), truncates it.
-    """
-    try:
-        words = text.split()
-        if len(words) < 50:
-            return text, [text]
-        if len(text) > 1024:
-            text = text[:1024]
-        summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-        summary_output = summarizer(text, max_length=500, min_length=500, do_sample=False, truncation=True)
-        summary = summary_output[0]['summary_text']
-        key_points = summary.split(". ")
-        return summary, key_points
-    except Exception as e:
-        raise RuntimeError(f"Error summarizing text: {str(e)}")
-
-def text_to_speech(summary_text, output_file="audio_summary.mp3"):
-    """
-    Converts summary text to speech and saves it as an MP3 file.
-    """
-    try:
-        tts = gTTS(text=summary_text, lang='en')
-        tts.save(output_file)
-        return output_file
-    except Exception as e:
-        raise RuntimeError(f"Error generating audio summary: {str(e)}")
-
-def save_to_database(filename, transcription, summary, key_points):
-    """
-    Saves transcription, summary, and key points to a MySQL database.
-    """
-    connection = None
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS audio_data (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                filename VARCHAR(255),
-                transcription TEXT,
-                summary TEXT,
-                key_points TEXT,
-                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        key_points_str = "; ".join(key_points)
-        query = """
-            INSERT INTO audio_data (filename, transcription, summary, key_points)
-            VALUES (%s, %s, %s, %s)
-        """
-        cursor.execute(query, (filename, transcription, summary, key_points_str))
-        connection.commit()
-        print("Data saved successfully to the database.")
-    except mysql.connector.Error as err:
-        raise RuntimeError(f"Error connecting to MySQL: {err}")
-    finally:
-        if connection is not None and connection.is_connected():
-            cursor.close()
-            connection.close()
-
-def process_and_summarize_audio(file_path):
-    """
-    Integrates the full workflow: process audio, transcribe, summarize, TTS, and save to DB.
-    """
-    try:
-        processed_audio_path = process_audio(file_path)
-        transcription = transcribe_audio(processed_audio_path)
-        summary, key_points = summarize_text(transcription)
-        tts_file = text_to_speech(summary)
-        save_to_database(os.path.basename(file_path), transcription, summary, key_points)
-        return {
-            "processed_audio": processed_audio_path,
-            "transcription": transcription,
-            "summary": summary,
-            "key_points": key_points,
-            "tts_file": tts_file
-        }
-    except Exception as e:
+import os
+import re
+import json
+import numpy as np
+import soundfile as sf  # Using soundfile to write WAV files
+from model_registry import registry
+from persistence import get_database
+from tts import get_synthesizer
+from sharded_transcribe import TRANSCRIBE_WORKERS, transcribe_sharded
+from metrics import StageTimer, stage_metrics
+from inference import load_whisper, load_summarizer
+import vad
+import diarization
+
+# torch, transformers, whisper, librosa, noisereduce and soxr are imported where
+# they are first needed, so importing this module (and binding the server) is
+# fast and the text-only path never loads the audio stack.
+
+WHISPER_MODEL_NAME = "base"
+SUMMARIZER_MODEL_NAME = "facebook/bart-large-cnn"
+
+# Both models honour INFERENCE_MODE (fp32, int8 or onnx); see inference.py.
+def _load_whisper():
+    return load_whisper(WHISPER_MODEL_NAME)
+
+def _warm_whisper(whisper_model):
+    # One second of silence is enough to initialise the encoder/decoder kernels.
+    whisper_model.transcribe(np.zeros(16000, dtype=np.float32), fp16=whisper_model.device.type == "cuda")
+
+def _load_summarizer():
+    return load_summarizer(SUMMARIZER_MODEL_NAME)
+
+def _warm_summarizer(summarizer):
+    summarizer("The meeting started on time. " * 10, max_length=20, min_length=5, do_sample=False)
+
+# Models are loaded once per process and shared across request threads.
+registry.register("whisper", _load_whisper, _warm_whisper)
+registry.register("summarizer", _load_summarizer, _warm_summarizer)
+
+# Summarization settings. BART accepts at most 1024 tokens per input, so long
+# transcripts are split into chunks that are summarized in batches and then
+# reduced recursively until the combined text fits in a single pass.
+SUMMARY_CHUNK_TOKENS = 900
+SUMMARY_BATCH_SIZE = int(os.environ.get("SUMMARY_BATCH_SIZE", "4"))
+CHUNK_SUMMARY_MAX_LENGTH = 150
+CHUNK_SUMMARY_MIN_LENGTH = 30
+
+def warm_up_models():
+    """
+    Loads and warms all models so the first request does not pay the load cost.
+    """
+    registry.warm_up()
+
+# Audio preprocessing settings. Files are streamed in blocks so that peak
+# memory depends on the block size rather than on the recording length.
+TARGET_SAMPLE_RATE = 16000
+PREPROCESS_BLOCK_SECONDS = 30
+PREPROCESS_OVERLAP_SECONDS = 1
+NOISE_PROFILE_FRAME_SECONDS = 0.05
+NOISE_PROFILE_QUANTILE = 0.1
+# Strip non-speech before noise reduction and transcription (see vad.py).
+VAD_ENABLED = os.environ.get("VAD_ENABLED", "1") != "0"
+
+def _estimate_noise_profile(y, sr):
+    """
+    Builds a noise clip from the quietest frames of y (by RMS energy).
+    """
+    frame = max(1, int(NOISE_PROFILE_FRAME_SECONDS * sr))
+    n_frames = len(y) // frame
+    if n_frames < 2:
+        return y
+    frames = y[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    quietest = np.sort(np.argsort(rms)[:max(2, int(n_frames * NOISE_PROFILE_QUANTILE))])
+    return frames[quietest].reshape(-1)
+
+def _lookahead(iterable):
+    """
+    Yields (item, is_last) pairs.
+    """
+    iterator = iter(iterable)
+    try:
+        previous = next(iterator)
+    except StopIteration:
+        return
+    for item in iterator:
+        yield previous, False
+        previous = item
+    yield previous, True
+
+def _speech_only(blocks, sr, timeline, noise_clip, timer):
+    """
+    Yields the speech regions of consecutive, non-overlapping blocks and records
+    [compact_start, original_start, duration, original_end] (in samples) in
+    timeline so timestamps in the speech-only audio can be mapped back.
+    """
+    noise_floor = vad.NoiseFloorTracker()
+    noise_floor.update(noise_clip, sr)
+    original_pos = 0
+    compact_pos = 0
+    for block in blocks:
+        if VAD_ENABLED:
+            with timer.time():
+                regions = vad.speech_regions(block, sr, noise_floor=noise_floor.update(block, sr))
+        else:
+            regions = [(0, len(block))]
+        for start, end in regions:
+            original_start = original_pos + start
+            if timeline and timeline[-1][3] == original_start:
+                # Region continues across the block boundary.
+                timeline[-1][2] += end - start
+                timeline[-1][3] += end - start
+            else:
+                timeline.append([compact_pos, original_start, end - start, original_start + end - start])
+            compact_pos += end - start
+            yield block[start:end]
+        original_pos += len(block)
+
+def _overlapping_blocks(chunks, blocksize, overlap):
+    """
+    Regroups a stream of arrays into blocks of blocksize samples where each
+    block repeats the last overlap samples of the previous one.
+    """
+    pending, pending_len = [], 0
+    emitted = False
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_len += len(chunk)
+        if pending_len < blocksize:
+            continue
+        buffer = np.concatenate(pending)
+        while len(buffer) >= blocksize:
+            yield buffer[:blocksize]
+            emitted = True
+            buffer = buffer[blocksize - overlap:]
+        pending, pending_len = [buffer], len(buffer)
+    if pending_len > (overlap if emitted else 0):
+        yield np.concatenate(pending)
+
+def _denoise_and_resample_blocks(blocks, sr, overlap, output_path, noise_clip, timers):
+    """
+    Streams overlapping mono blocks through stationary noise reduction and a
+    stateful soxr resampler, writing 16 kHz PCM to output_path as it goes.
+    Half of each overlap is discarded on either side of a block boundary so the
+    edge effects of the noise filter never reach the output.
+    """
+    import noisereduce as nr
+    import soxr
+    head_trim = overlap // 2
+    tail_trim = overlap - head_trim
+    resampler = None
+    if sr != TARGET_SAMPLE_RATE:
+        resampler = soxr.ResampleStream(sr, TARGET_SAMPLE_RATE, 1, dtype='float32')
+    with sf.SoundFile(output_path, 'w', samplerate=TARGET_SAMPLE_RATE, channels=1, subtype='PCM_16') as out:
+        for index, (block, is_last) in enumerate(_lookahead(blocks)):
+            with timers["denoise"].time():
+                reduced = nr.reduce_noise(y=block, sr=sr, stationary=True, y_noise=noise_clip)
+                reduced = np.nan_to_num(reduced, nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32)
+            start = head_trim if index > 0 else 0
+            end = len(reduced) if is_last else len(reduced) - tail_trim
+            reduced = reduced[start:end]
+            if resampler is not None:
+                with timers["resample"].time():
+                    reduced = resampler.resample_chunk(reduced, last=is_last)
+            out.write(reduced)
+
+def _iter_mono_blocks(file_path, blocksize):
+    for block in sf.blocks(file_path, blocksize=blocksize, dtype='float32', always_2d=True):
+        yield block.mean(axis=1)
+
+def _vad_info_path(processed_path):
+    return os.path.splitext(processed_path)[0] + ".vad.json"
+
+def load_vad_info(processed_path):
+    """
+    Returns the speech statistics and timeline written by process_audio for a
+    processed file, or None if the file was not produced by process_audio.
+    """
+    info_path = _vad_info_path(processed_path)
+    if not os.path.exists(info_path):
+        return None
+    with open(info_path) as f:
+        return json.load(f)
+
+def process_audio(file_path, source=None):
+    """
+    Preprocesses audio by streaming it in blocks, keeping only speech regions,
+    reducing noise, and resampling to 16kHz. Formats soundfile cannot read are
+    decoded in one piece with librosa instead.
+    The speech ratio and the timeline needed to map timestamps back to the
+    original recording are saved next to the output (see load_vad_info).
+    If given, source() must return a fresh file object of the input for each
+    pass (e.g. over a file that is still being uploaded); file_path then only
+    names the output.
+    """
+    open_input = source or (lambda: file_path)
+    try:
+        output_path = os.path.splitext(file_path)[0] + "_processed.wav"
+        blocksize = None
+        # The steps are interleaved block by block, so each one accumulates its
+        # time over the whole file and is recorded once at the end.
+        timers = {name: StageTimer() for name in ("decode", "vad", "denoise", "resample")}
+        with timers["decode"].time():
+            try:
+                info = sf.info(open_input())
+                sr, total_frames = info.samplerate, info.frames
+                blocksize = int(PREPROCESS_BLOCK_SECONDS * sr)
+                head, _ = sf.read(open_input(), frames=blocksize, dtype='float32', always_2d=True)
+                noise_clip = _estimate_noise_profile(head.mean(axis=1), sr)
+                raw_blocks = _iter_mono_blocks(open_input(), blocksize)
+            except RuntimeError:
+                if source is not None:
+                    raise
+                import librosa
+                y, sr = librosa.load(file_path, sr=None)
+                total_frames = len(y)
+                blocksize = int(PREPROCESS_BLOCK_SECONDS * sr)
+                noise_clip = _estimate_noise_profile(y[:blocksize], sr)
+                raw_blocks = (y[start:start + blocksize] for start in range(0, len(y), blocksize))
+        print(f"Original sample rate: {sr}, Audio duration: {total_frames/sr:.2f}s")
+        overlap = int(PREPROCESS_OVERLAP_SECONDS * sr)
+        timeline = []
+        speech = _speech_only(timers["decode"].iterate(raw_blocks), sr, timeline, noise_clip, timers["vad"])
+        _denoise_and_resample_blocks(
+            _overlapping_blocks(speech, blocksize + overlap, overlap), sr, overlap, output_path, noise_clip, timers
+        )
+        original_seconds = total_frames / sr
+        for name, timer in timers.items():
+            timer.audio_seconds = original_seconds
+            stage_metrics.record(name, timer)
+        speech_seconds = sum(entry[2] for entry in timeline) / sr
+        vad_info = {
+            "original_seconds": round(original_seconds, 2),
+            "speech_seconds": round(speech_seconds, 2),
+            "speech_ratio": round(speech_seconds / original_seconds, 3) if original_seconds else 0.0,
+            "skipped_seconds": round(original_seconds - speech_seconds, 2),
+            "timeline": [[c / sr, o / sr, d / sr] for c, o, d, _ in timeline],
+        }
+        with open(_vad_info_path(output_path), 'w') as f:
+            json.dump(vad_info, f)
+        print(f"Speech: {speech_seconds:.2f}s of {original_seconds:.2f}s "
+              f"({vad_info['speech_ratio']:.0%}), skipped {vad_info['skipped_seconds']:.2f}s")
+        return output_path
+    except Exception as e:
+        raise RuntimeError(f"Error processing audio: {str(e)}")
+
+def transcribe_segments(file_path):
+    """
+    Transcribes audio using Whisper and returns (text, segments). Segment
+    timestamps are mapped back to the original recording when the file was
+    produced by process_audio. Long files are sharded across
+    TRANSCRIBE_WORKERS processes (see sharded_transcribe.py).
+    """
+    info = sf.info(file_path)
+    with registry.use("whisper") as model, stage_metrics.measure("whisper", info.frames / info.samplerate):
+        result = None
+        if TRANSCRIBE_WORKERS > 1:
+            result = transcribe_sharded(file_path, model, WHISPER_MODEL_NAME)
+        if result is None:
+            result = model.transcribe(file_path)
+    vad_info = load_vad_info(file_path)
+    timeline = vad_info["timeline"] if vad_info else []
+    segments = [
+        {
+            "start": round(vad.map_to_original(segment["start"], timeline), 2),
+            "end": round(vad.map_to_original(segment["end"], timeline), 2),
+            "text": segment["text"].strip(),
+        }
+        for segment in result["segments"]
+    ]
+    return result['text'], segments
+
+def diarize_segments(file_path, segments):
+    """
+    Labels transcript segments of a processed file with speakers and returns
+    (segments, number of speakers). Only the speech regions that process_audio
+    kept are analysed, and the file is read in blocks.
+    """
+    info = sf.info(file_path)
+    with stage_metrics.measure("diarize", info.duration):
+        vad_info = load_vad_info(file_path)
+        timeline = vad_info["timeline"] if vad_info else []
+        # Without a VAD timeline (VAD disabled, or a live recording) the file is
+        # the original recording, and the transcript segments mark its speech.
+        regions = ([(compact, compact + duration) for compact, _, duration in timeline]
+                   or [(segment["start"], segment["end"]) for segment in segments])
+        blocks = _iter_mono_blocks(file_path, int(PREPROCESS_BLOCK_SECONDS * info.samplerate))
+        return diarization.diarize(blocks, info.samplerate, info.frames, segments, regions,
+                                   lambda t: vad.map_to_original(t, timeline))
+
+def transcribe_audio(file_path):
+    """
+    Transcribes audio using Whisper.
+    """
+    try:
+        transcription, _ = transcribe_segments(file_path)
+        return transcription
+    except Exception as e:
+        raise RuntimeError(f"Error transcribing audio: {str(e)}")
+
+def _split_sentences(text):
+    return [s for s in re.split(r'(?<=[.!?])\s+', text.strip()) if s]
+
+def _chunk_text(text, tokenizer, max_tokens=SUMMARY_CHUNK_TOKENS):
+    """
+    Packs whole sentences into chunks of at most max_tokens tokens. Sentences
+    that are longer than a chunk on their own are split on token boundaries.
+    """
+    sentences = _split_sentences(text)
+    token_ids = tokenizer(sentences, add_special_tokens=False)['input_ids']
+    chunks = []
+    current, current_tokens = [], 0
+    for sentence, ids in zip(sentences, token_ids):
+        if len(ids) > max_tokens:
+            if current:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            for start in range(0, len(ids), max_tokens):
+                chunks.append(tokenizer.decode(ids[start:start + max_tokens]))
+            continue
+        if current_tokens + len(ids) > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += len(ids)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def _count_tokens(text, tokenizer):
+    return len(tokenizer(text, add_special_tokens=False)['input_ids'])
+
+def _reduce_to_context(summarizer, text):
+    """
+    Map-reduce step: summarizes chunks in batched pipeline calls and repeats on
+    the joined chunk summaries until the text fits in one BART context window.
+    Each level shrinks the text by roughly CHUNK_TOKENS / CHUNK_SUMMARY_MAX_LENGTH,
+    so total work stays linear in the transcript length.
+    """
+    tokenizer = summarizer.tokenizer
+    while _count_tokens(text, tokenizer) > SUMMARY_CHUNK_TOKENS:
+        chunks = _chunk_text(text, tokenizer)
+        outputs = summarizer(
+            chunks,
+            batch_size=SUMMARY_BATCH_SIZE,
+            max_length=CHUNK_SUMMARY_MAX_LENGTH,
+            min_length=CHUNK_SUMMARY_MIN_LENGTH,
+            do_sample=False,
+            truncation=True,
+        )
+        text = " ".join(output['summary_text'] for output in outputs)
+    return text
+
+def summarize_with(summarizer, text):
+    """
+    Runs the full summarization (reduce, then final summary) on a given
+    summarization pipeline and returns the summary text.
+    """
+    text = _reduce_to_context(summarizer, text)
+    summary_output = summarizer(text, max_length=500, min_length=500, do_sample=False, truncation=True)
+    return summary_output[0]['summary_text']
+
+def summarize_text(text):
+    """
+    Summarizes text and extracts key points using Hugging Face transformers.
+    If text is less than 50 words, returns it as is.
+    If text does not fit in BART's context window, it is summarized chunk by
+    chunk and the chunk summaries are reduced before the final summary.
+    """
+    try:
+        words = text.split()
+        if len(words) < 50:
+            return text, [text]
+        with registry.use("summarizer") as summarizer, stage_metrics.measure("bart"):
+            summary = summarize_with(summarizer, text)
+        key_points = summary.split(". ")
+        return summary, key_points
+    except Exception as e:
+        raise RuntimeError(f"Error summarizing text: {str(e)}")
+
+def text_to_speech(summary_text, output_file=None):
+    """
+    Converts summary text to speech and saves it to output_file (a new file per
+    call by default). Uses the offline engine when available; see tts.py.
+    Returns the path of the written file, whose extension matches the engine.
+    """
+    try:
+        with stage_metrics.measure("tts"):
+            return get_synthesizer().synthesize(summary_text, output_file)
+    except Exception as e:
+        raise RuntimeError(f"Error generating audio summary: {str(e)}")
+
+def save_to_database(filename, transcription, summary, key_points, segments=None):
+    """
+    Saves transcription, summary, key points and (speaker-attributed) segments
+    to the database. Concurrent calls are grouped into multi-row inserts by the
+    persistence layer.
+    """
+    get_database().save_meeting(filename, transcription, summary, key_points, segments)
+
+def process_and_summarize_audio(file_path):
+    """
+    Integrates the full workflow: process audio, transcribe, summarize, TTS, and save to DB.
+    """
+    try:
+        processed_audio_path = process_audio(file_path)
+        transcription = transcribe_audio(processed_audio_path)
+        summary, key_points = summarize_text(transcription)
+        tts_file = text_to_speech(summary)
+        save_to_database(os.path.basename(file_path), transcription, summary, key_points)
+        return {
+            "processed_audio": processed_audio_path,
+            "transcription": transcription,
+            "summary": summary,
+            "key_points": key_points,
+            "tts_file": tts_file
+        }
+    except Exception as e:
         raise RuntimeError(f"Error processing and summarizing audio: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,130 @@
+import numpy as np
+
+# Energy/spectral voice activity detection on mono float audio.
+FRAME_SECONDS = 0.03
+# A frame counts as speech when its RMS exceeds the noise floor by this factor.
+ENERGY_RATIO = 3.0
+# RMS below this is always treated as silence, even in a very clean recording.
+MIN_SPEECH_RMS = 0.005
+NOISE_FLOOR_PERCENTILE = 10
+# Starting floor for live streams, whose first chunk may already be speech. Any
+# frame louder than MIN_SPEECH_RMS counts as speech until quieter frames arrive.
+INITIAL_NOISE_FLOOR = MIN_SPEECH_RMS / ENERGY_RATIO
+# Factor per second of audio by which a tracked noise floor may drift upwards.
+NOISE_FLOOR_RISE_PER_SECOND = 1.02
+# Frames whose spectrum is flatter than this look like broadband noise, not voice.
+MAX_SPECTRAL_FLATNESS = 0.5
+# Region post-processing for speech_regions().
+MIN_SPEECH_SECONDS = 0.15
+MIN_SILENCE_SECONDS = 0.3
+PAD_SECONDS = 0.2
+
+
+def _frames(y, sr, frame_seconds):
+    frame = max(1, int(frame_seconds * sr))
+    n_frames = len(y) // frame
+    return y[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+
+
+def frame_rms(y, sr, frame_seconds=FRAME_SECONDS):
+    """
+    Returns the RMS energy of consecutive non-overlapping frames of y.
+    """
+    frames = _frames(y, sr, frame_seconds)
+    if len(frames) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def spectral_flatness(y, sr, frame_seconds=FRAME_SECONDS):
+    """
+    Returns the spectral flatness (geometric / arithmetic mean of the power
+    spectrum) of the same frames as frame_rms. Values near 1 mean noise-like.
+    """
+    frames = _frames(y, sr, frame_seconds)
+    if len(frames) == 0:
+        return np.zeros(0, dtype=np.float32)
+    power = np.abs(np.fft.rfft(frames * np.hanning(frames.shape[1]), axis=1)) ** 2 + 1e-10
+    return np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+
+def speech_mask(y, sr, noise_floor=None, frame_seconds=FRAME_SECONDS):
+    """
+    Returns a boolean speech/non-speech decision per frame: a frame is speech if
+    it is well above the noise floor and its spectrum is not noise-like. The
+    noise floor is estimated from the quietest frames of y unless one is given.
+    """
+    rms = frame_rms(y, sr, frame_seconds)
+    if len(rms) == 0:
+        return np.zeros(0, dtype=bool)
+    if noise_floor is None:
+        noise_floor = np.percentile(rms, NOISE_FLOOR_PERCENTILE)
+    loud = rms > max(noise_floor * ENERGY_RATIO, MIN_SPEECH_RMS)
+    return loud & (spectral_flatness(y, sr, frame_seconds) < MAX_SPECTRAL_FLATNESS)
+
+
+class NoiseFloorTracker:
+    """
+    Tracks the noise floor across consecutive chunks of a stream. A chunk that
+    is entirely speech has no quiet frames of its own, so the floor follows
+    drops immediately but rises only slowly.
+    """
+
+    def __init__(self, initial=None):
+        self.floor = initial
+
+    def update(self, y, sr):
+        rms = frame_rms(y, sr)
+        if len(rms) == 0:
+            return self.floor
+        chunk_floor = float(np.percentile(rms, NOISE_FLOOR_PERCENTILE))
+        if self.floor is None:
+            self.floor = chunk_floor
+        else:
+            self.floor = min(self.floor * NOISE_FLOOR_RISE_PER_SECOND ** (len(y) / sr), chunk_floor)
+        return self.floor
+
+
+def runs(mask, value):
+    """
+    Returns (start, end) frame index pairs of consecutive runs equal to value.
+    """
+    padded = np.concatenate(([False], mask == value, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])]
+
+
+def speech_regions(y, sr, noise_floor=None, frame_seconds=FRAME_SECONDS):
+    """
+    Returns (start, end) sample ranges of speech in y. Bursts shorter than
+    MIN_SPEECH_SECONDS are dropped, regions are padded by PAD_SECONDS, and
+    regions separated by less than MIN_SILENCE_SECONDS are merged.
+    """
+    mask = speech_mask(y, sr, noise_floor, frame_seconds)
+    frame = max(1, int(frame_seconds * sr))
+    min_speech = int(MIN_SPEECH_SECONDS / frame_seconds)
+    pad = int(PAD_SECONDS * sr)
+    min_gap = int(MIN_SILENCE_SECONDS * sr)
+    regions = []
+    for start, end in runs(mask, True):
+        if end - start < min_speech:
+            continue
+        start, end = max(0, start * frame - pad), min(len(y), end * frame + pad)
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def map_to_original(t, timeline):
+    """
+    Maps a time t (seconds) in speech-only audio back to the original recording.
+    timeline is a list of (compact_start, original_start, duration) entries.
+    """
+    if not timeline:
+        return t
+    starts = [entry[0] for entry in timeline]
+    index = max(0, int(np.searchsorted(starts, t, side='right')) - 1)
+    compact_start, original_start, duration = timeline[index]
+    return original_start + min(max(t - compact_start, 0.0), duration)